@@ -15,117 +15,179 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from typing import Dict, List, Any, Tuple
-from scipy.stats import pearsonr, spearmanr
+from scipy.stats import rankdata
 from scipy.spatial.distance import cosine
 
+try:
+    import orjson  # optional C JSON parser, falls back to stdlib json
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa  # optional multi-threaded CSV writer, falls back to pandas
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
 # Set up logging and style
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 plt.style.use('default')
 sns.set_palette("husl")
 
+# Buffer size for evaluation/output file IO (1 MB instead of the 8 KB default)
+IO_BUFFER_SIZE = 1024 * 1024
+
+# Per-model annotation fields and the value used when a model lacks a message
+MODEL_FIELD_DEFAULTS = {
+    'polarity': 0,
+    'emotion_primary': 'neutral_info',
+    'emotion_summary': '',
+    'stress_score': 0,
+    'uncertainty_score': 0,
+    'help_request': False,
+    'helpfulness': 0,
+    'gratitude': False,
+    'toxicity_score': 0,
+    'info_drop': False,
+}
+
+def load_model_file(file_path: Path) -> Tuple[str, Any]:
+    """Load one model's sentiment results; data is None if the file cannot be read."""
+    # Extract model name from filename
+    if "4o_mini" in file_path.name:
+        model_name = "GPT-4o-mini"
+    elif "gpt5" in file_path.name:
+        model_name = "GPT-5"
+    else:
+        model_name = file_path.stem.split('.')[-1]
+    
+    try:
+        with open(file_path, 'rb', buffering=IO_BUFFER_SIZE) as f:
+            raw = f.read()
+        data = orjson.loads(raw) if orjson else json.loads(raw)
+        logging.info(f"Loaded {len(data)} messages from {model_name}")
+        return model_name, data
+    except Exception as e:
+        logging.error(f"Error loading {file_path}: {e}")
+        return model_name, None
+
 def load_model_results(eval_dir: Path) -> Dict[str, List[Dict[str, Any]]]:
     """Load sentiment results from different models."""
     models = {}
     
-    for file_path in eval_dir.glob("*.json"):
-        if "sentiment" in file_path.name:
-            # Extract model name from filename
-            if "4o_mini" in file_path.name:
-                model_name = "GPT-4o-mini"
-            elif "gpt5" in file_path.name:
-                model_name = "GPT-5"
-            else:
-                model_name = file_path.stem.split('.')[-1]
-            
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+    paths = [file_path for file_path in eval_dir.glob("*.json") if "sentiment" in file_path.name]
+    if not paths:
+        return models
+    
+    # Files are independent, so read and parse them concurrently
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        for model_name, data in executor.map(load_model_file, paths):
+            if data is not None:
                 models[model_name] = data
-                logging.info(f"Loaded {len(data)} messages from {model_name}")
-            except Exception as e:
-                logging.error(f"Error loading {file_path}: {e}")
     
     return models
 
+def extract_model_columns(data: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Extract the aligned fields of one model's messages into preallocated typed columns."""
+    n = len(data)
+    
+    # Messages without an id are matched by position
+    columns = {
+        'message_id': np.arange(n).astype(object),
+        'body': np.full(n, '', dtype=object),
+        'timestamp': np.full(n, '', dtype=object),
+    }
+    for field, default in MODEL_FIELD_DEFAULTS.items():
+        if isinstance(default, bool):
+            columns[field] = np.zeros(n, dtype=np.bool_)
+        elif isinstance(default, (int, float)):
+            columns[field] = np.zeros(n, dtype=np.float64)
+        else:
+            columns[field] = np.full(n, default, dtype=object)
+    
+    for idx, msg in enumerate(data):
+        for key, values in columns.items():
+            value = msg.get(key)
+            if value is not None:
+                values[idx] = value
+    
+    return columns
+
 def align_messages(models: Dict[str, List[Dict[str, Any]]]) -> pd.DataFrame:
     """Align messages from different models by message_id."""
-    # Create a combined dataframe
-    aligned_data = []
-    
     # Get all model names
     model_names = list(models.keys())
     if len(model_names) < 2:
         raise ValueError("Need at least 2 models to compare")
     
+    # One frame per model indexed by message_id
+    frames = {}
+    for model_name in model_names:
+        frame = pd.DataFrame(extract_model_columns(models[model_name])).set_index('message_id')
+        frames[model_name] = frame[~frame.index.duplicated(keep='first')]
+    
     # Use first model as reference
-    reference_model = model_names[0]
-    reference_data = {msg.get('message_id', idx): msg for idx, msg in enumerate(models[reference_model])}
-    
-    for msg_id, ref_msg in reference_data.items():
-        row = {
-            'message_id': msg_id,
-            'body': ref_msg.get('body', ''),
-            'timestamp': ref_msg.get('timestamp', ''),
-        }
-        
-        # Add data from each model
-        for model_name in model_names:
-            model_data = models[model_name]
-            # Find matching message by ID or index
-            model_msg = None
-            if isinstance(msg_id, str):
-                model_msg = next((msg for msg in model_data if msg.get('message_id') == msg_id), None)
-            else:
-                if msg_id < len(model_data):
-                    model_msg = model_data[msg_id]
-            
-            if model_msg:
-                row[f'{model_name}_polarity'] = model_msg.get('polarity', 0)
-                row[f'{model_name}_emotion_primary'] = model_msg.get('emotion_primary', 'neutral_info')
-                row[f'{model_name}_emotion_summary'] = model_msg.get('emotion_summary', '')
-                row[f'{model_name}_stress_score'] = model_msg.get('stress_score', 0)
-                row[f'{model_name}_uncertainty_score'] = model_msg.get('uncertainty_score', 0)
-                row[f'{model_name}_help_request'] = model_msg.get('help_request', False)
-                row[f'{model_name}_helpfulness'] = model_msg.get('helpfulness', 0)
-                row[f'{model_name}_gratitude'] = model_msg.get('gratitude', False)
-                row[f'{model_name}_toxicity_score'] = model_msg.get('toxicity_score', 0)
-                row[f'{model_name}_info_drop'] = model_msg.get('info_drop', False)
-            else:
-                # Fill with defaults if message not found
-                for field in ['polarity', 'stress_score', 'uncertainty_score', 'helpfulness', 'toxicity_score']:
-                    row[f'{model_name}_{field}'] = 0
-                for field in ['emotion_primary', 'emotion_summary']:
-                    row[f'{model_name}_{field}'] = 'neutral_info' if field == 'emotion_primary' else ''
-                for field in ['help_request', 'gratitude', 'info_drop']:
-                    row[f'{model_name}_{field}'] = False
-        
-        aligned_data.append(row)
+    aligned = frames[model_names[0]][['body', 'timestamp']]
+    model_frames = [frames[model_name][list(MODEL_FIELD_DEFAULTS)].add_prefix(f'{model_name}_')
+                    for model_name in model_names]
+    
+    if all(model_frame.index.equals(aligned.index) for model_frame in model_frames):
+        # Same messages in the same order: place columns side by side without a join
+        aligned = pd.concat([aligned, *model_frames], axis=1)
+    else:
+        # Hash-join every model onto the reference
+        for model_frame in model_frames:
+            aligned = aligned.join(model_frame, how='left')
+    
+    # Fill with defaults where a message or field is missing
+    defaults = {'body': '', 'timestamp': ''}
+    for model_name in model_names:
+        defaults.update({f'{model_name}_{field}': value for field, value in MODEL_FIELD_DEFAULTS.items()})
+    aligned = aligned.fillna(defaults).infer_objects()
+    
+    # Keep flags as 1-byte bools even when the join path left them as objects
+    flag_cols = [f'{model_name}_{field}' for model_name in model_names
+                 for field, default in MODEL_FIELD_DEFAULTS.items() if isinstance(default, bool)]
+    aligned[flag_cols] = aligned[flag_cols].astype(np.bool_)
     
-    return pd.DataFrame(aligned_data)
+    # Low-cardinality emotion labels group and count on integer codes
+    for model_name in model_names:
+        col = f'{model_name}_emotion_primary'
+        aligned[col] = aligned[col].astype('category')
+    
+    return aligned.reset_index()
 
 def calculate_correlations(df: pd.DataFrame, model_names: List[str]) -> Dict[str, float]:
     """Calculate correlations between models for numeric fields."""
     correlations = {}
     
     numeric_fields = ['polarity', 'stress_score', 'uncertainty_score', 'helpfulness', 'toxicity_score']
-    
-    for field in numeric_fields:
-        col1 = f'{model_names[0]}_{field}'
-        col2 = f'{model_names[1]}_{field}'
-        
-        if col1 in df.columns and col2 in df.columns:
-            # Remove any NaN values
-            valid_data = df[[col1, col2]].dropna()
-            if len(valid_data) > 1:
-                pearson_corr, _ = pearsonr(valid_data[col1], valid_data[col2])
-                spearman_corr, _ = spearmanr(valid_data[col1], valid_data[col2])
-                correlations[field] = {
-                    'pearson': pearson_corr,
-                    'spearman': spearman_corr,
-                    'count': len(valid_data)
-                }
+    fields = [field for field in numeric_fields
+              if f'{model_names[0]}_{field}' in df.columns and f'{model_names[1]}_{field}' in df.columns]
+    if not fields:
+        return correlations
+    
+    # Stack both models' columns side by side and remove any NaN rows once
+    cols = [f'{model_name}_{field}' for model_name in model_names[:2] for field in fields]
+    arr = df[cols].to_numpy(dtype=np.float64)
+    arr = arr[~np.isnan(arr).any(axis=1)]
+    if len(arr) <= 1:
+        return correlations
+    
+    # Column i of the first model pairs with column i + len(fields) of the second
+    n = len(fields)
+    pearson = np.corrcoef(arr, rowvar=False)
+    spearman = np.corrcoef(rankdata(arr, axis=0), rowvar=False)
+    
+    for i, field in enumerate(fields):
+        correlations[field] = {
+            'pearson': pearson[i, i + n],
+            'spearman': spearman[i, i + n],
+            'count': len(arr)
+        }
     
     return correlations
 
@@ -136,60 +198,82 @@ def find_most_different_messages(df: pd.DataFrame, model_names: List[str], top_n
     
     df['polarity_diff'] = abs(df[pol_col1] - df[pol_col2])
     
-    most_different = df.nlargest(top_n, 'polarity_diff')
-    
-    results = []
-    for _, row in most_different.iterrows():
-        results.append({
-            'message_id': row['message_id'],
-            'body': row['body'][:200] + "..." if len(row['body']) > 200 else row['body'],
-            f'{model_names[0]}_polarity': row[pol_col1],
-            f'{model_names[1]}_polarity': row[pol_col2],
-            'difference': row['polarity_diff'],
-            f'{model_names[0]}_emotion': row[f'{model_names[0]}_emotion_primary'],
-            f'{model_names[1]}_emotion': row[f'{model_names[1]}_emotion_primary'],
-        })
-    
-    return results
+    # O(N) top-k selection; ties keep their original order like nlargest
+    diff = df['polarity_diff'].to_numpy()
+    k = min(top_n, len(diff))
+    if k <= 0:
+        return []
+    kth = np.partition(diff, len(diff) - k)[len(diff) - k]
+    above = np.flatnonzero(diff > kth)
+    ties = np.flatnonzero(diff == kth)[:k - len(above)]
+    top_idx = np.concatenate([above, ties])
+    top_idx = top_idx[np.lexsort((top_idx, -diff[top_idx]))]
+    
+    emotion_col1 = f'{model_names[0]}_emotion_primary'
+    emotion_col2 = f'{model_names[1]}_emotion_primary'
+    most_different = df.iloc[top_idx][['message_id', 'body', pol_col1, pol_col2, 'polarity_diff',
+                                       emotion_col1, emotion_col2]]
+    most_different = most_different.rename(columns={
+        'polarity_diff': 'difference',
+        emotion_col1: f'{model_names[0]}_emotion',
+        emotion_col2: f'{model_names[1]}_emotion',
+    })
+    
+    body = most_different['body']
+    most_different = most_different.assign(
+        body=body.str.slice(0, 200).where(body.str.len() <= 200, body.str.slice(0, 200) + "..."))
+    
+    return most_different.to_dict('records')
 
 def calculate_basic_statistics(df: pd.DataFrame, model_names: List[str]) -> Dict[str, Dict]:
     """Calculate basic statistics for each model."""
     stats = {}
     
     numeric_fields = ['polarity', 'stress_score', 'uncertainty_score', 'helpfulness', 'toxicity_score']
+    bool_fields = ['help_request', 'gratitude', 'info_drop']
+    
+    # Summarize every numeric column in one agg call and every boolean column in one reduction
+    num_cols = [f'{model_name}_{field}' for model_name in model_names for field in numeric_fields
+                if f'{model_name}_{field}' in df.columns]
+    summary = df[num_cols].agg(['mean', 'std', 'min', 'max', 'median'])
+    
+    bool_cols = [f'{model_name}_{field}' for model_name in model_names for field in bool_fields
+                 if f'{model_name}_{field}' in df.columns]
+    bool_counts = dict(zip(bool_cols, df[bool_cols].to_numpy(dtype=np.uint8).sum(axis=0)))
+    
+    # Count every model's emotions in one groupby over the stacked emotion columns
+    emotion_cols = [f'{model_name}_emotion_primary' for model_name in model_names
+                    if f'{model_name}_emotion_primary' in df.columns]
+    emotion_counts = (df[emotion_cols].melt(var_name='model', value_name='emotion')
+                      .groupby(['model', 'emotion'], observed=True).size().unstack('model', fill_value=0))
     
     for model_name in model_names:
         model_stats = {}
         
         for field in numeric_fields:
             col_name = f'{model_name}_{field}'
-            if col_name in df.columns:
-                model_stats[field] = {
-                    'mean': df[col_name].mean(),
-                    'std': df[col_name].std(),
-                    'min': df[col_name].min(),
-                    'max': df[col_name].max(),
-                    'median': df[col_name].median(),
-                }
+            if col_name in summary.columns:
+                model_stats[field] = summary[col_name].to_dict()
         
         # Emotion distribution
         emotion_col = f'{model_name}_emotion_primary'
-        if emotion_col in df.columns:
-            model_stats['emotion_distribution'] = df[emotion_col].value_counts().to_dict()
+        if emotion_col in emotion_counts.columns:
+            counts = emotion_counts[emotion_col]
+            model_stats['emotion_distribution'] = counts[counts > 0].sort_values(ascending=False, kind='stable').to_dict()
         
         # Boolean field counts
-        bool_fields = ['help_request', 'gratitude', 'info_drop']
         for field in bool_fields:
             col_name = f'{model_name}_{field}'
-            if col_name in df.columns:
-                model_stats[f'{field}_count'] = df[col_name].sum()
-                model_stats[f'{field}_percentage'] = (df[col_name].sum() / len(df)) * 100
+            if col_name in bool_counts:
+                model_stats[f'{field}_count'] = bool_counts[col_name]
+                model_stats[f'{field}_percentage'] = (bool_counts[col_name] / len(df)) * 100
         
         stats[model_name] = model_stats
     
     return stats
 
-def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir: Path):
+def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir: Path,
+                          correlations: Dict[str, Dict]):
     """Create comprehensive visualizations comparing the models."""
     output_dir.mkdir(exist_ok=True)
     
@@ -201,6 +285,12 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
     plt.rcParams['xtick.labelsize'] = 8
     plt.rcParams['ytick.labelsize'] = 8
     
+    # Extract the numeric columns once and reuse them across all panels
+    numeric_fields = ['polarity', 'stress_score', 'uncertainty_score', 'helpfulness', 'toxicity_score']
+    arrs = {f'{model_name}_{field}': df[f'{model_name}_{field}'].to_numpy()
+            for model_name in model_names[:2] for field in numeric_fields
+            if f'{model_name}_{field}' in df.columns}
+    
     # 1. Polarity comparison scatter plot
     fig, axes = plt.subplots(2, 2, figsize=(12, 10))
     fig.suptitle('Model Comparison Analysis', fontsize=14, fontweight='bold', y=0.98)
@@ -209,7 +299,7 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
     pol_col1 = f'{model_names[0]}_polarity'
     pol_col2 = f'{model_names[1]}_polarity'
     
-    axes[0, 0].scatter(df[pol_col1], df[pol_col2], alpha=0.6, s=30)
+    axes[0, 0].scatter(arrs[pol_col1], arrs[pol_col2], alpha=0.6, s=30)
     axes[0, 0].plot([-1, 1], [-1, 1], 'r--', label='Perfect Agreement')
     axes[0, 0].set_xlabel(f'{model_names[0]} Polarity')
     axes[0, 0].set_ylabel(f'{model_names[1]} Polarity')
@@ -218,8 +308,11 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
     axes[0, 0].grid(True, alpha=0.3)
     
     # 2. Polarity distribution comparison
-    axes[0, 1].hist(df[pol_col1], bins=30, alpha=0.7, label=model_names[0], density=True)
-    axes[0, 1].hist(df[pol_col2], bins=30, alpha=0.7, label=model_names[1], density=True)
+    bins = np.linspace(-1, 1, 31)
+    density1, _ = np.histogram(arrs[pol_col1], bins=bins, density=True)
+    density2, _ = np.histogram(arrs[pol_col2], bins=bins, density=True)
+    axes[0, 1].bar(bins[:-1], density1, width=np.diff(bins), align='edge', alpha=0.7, label=model_names[0])
+    axes[0, 1].bar(bins[:-1], density2, width=np.diff(bins), align='edge', alpha=0.7, label=model_names[1])
     axes[0, 1].set_xlabel('Polarity')
     axes[0, 1].set_ylabel('Density')
     axes[0, 1].set_title('Polarity Distribution')
@@ -229,19 +322,20 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
     # 3. Emotion distribution comparison by average polarity
     emotion_col1 = f'{model_names[0]}_emotion_primary'
     emotion_col2 = f'{model_names[1]}_emotion_primary'
-    pol_col1 = f'{model_names[0]}_polarity'
-    pol_col2 = f'{model_names[1]}_polarity'
     
-    # Calculate average polarity by emotion for each model
-    emotion_polarity1 = df.groupby(emotion_col1)[pol_col1].mean()
-    emotion_polarity2 = df.groupby(emotion_col2)[pol_col2].mean()
+    # Calculate average polarity by emotion for both models in one groupby
+    emotion_polarity = pd.concat([
+        df[[emotion_col1, pol_col1]].set_axis(['emotion', 'polarity'], axis=1).assign(model=model_names[0]),
+        df[[emotion_col2, pol_col2]].set_axis(['emotion', 'polarity'], axis=1).assign(model=model_names[1]),
+    ], ignore_index=True).groupby(['model', 'emotion'], observed=True)['polarity'].mean().unstack('model')
     
     # Get top emotions by frequency for consistent ordering
     top_emotions = df[emotion_col1].value_counts().head(8).index
     
     # Filter to only include top emotions and ensure both models have data
-    emotion_avg1 = emotion_polarity1.reindex(top_emotions).fillna(0)
-    emotion_avg2 = emotion_polarity2.reindex(top_emotions).fillna(0)
+    emotion_polarity = emotion_polarity.reindex(index=top_emotions, columns=model_names[:2]).fillna(0)
+    emotion_avg1 = emotion_polarity[model_names[0]]
+    emotion_avg2 = emotion_polarity[model_names[1]]
     
     x = np.arange(len(emotion_avg1))
     width = 0.35
@@ -262,21 +356,11 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
     plt.subplots_adjust(bottom=0.15, hspace=0.4, wspace=0.3, top=0.92)
     
     # 4. Correlation heatmap of numeric fields
-    numeric_fields = ['polarity', 'stress_score', 'uncertainty_score', 'helpfulness', 'toxicity_score']
-    corr_data = []
+    corr_fields = [field for field in numeric_fields if field in correlations]
     
-    for field in numeric_fields:
-        col1 = f'{model_names[0]}_{field}'
-        col2 = f'{model_names[1]}_{field}'
-        if col1 in df.columns and col2 in df.columns:
-            valid_data = df[[col1, col2]].dropna()
-            if len(valid_data) > 1:
-                corr = pearsonr(valid_data[col1], valid_data[col2])[0]
-                corr_data.append([field, corr])
-    
-    if corr_data:
-        corr_df = pd.DataFrame(corr_data, columns=['Field', 'Correlation'])
-        bars = axes[1, 1].bar(corr_df['Field'], corr_df['Correlation'])
+    if corr_fields:
+        corr_values = np.array([correlations[field]['pearson'] for field in corr_fields])
+        bars = axes[1, 1].bar(corr_fields, corr_values)
         axes[1, 1].set_xlabel('Sentiment Fields')
         axes[1, 1].set_ylabel('Pearson Correlation')
         axes[1, 1].set_title('Model Correlation by Field')
@@ -286,13 +370,9 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
         axes[1, 1].grid(True, alpha=0.3)
         
         # Color bars based on correlation strength
-        for bar, corr in zip(bars, corr_df['Correlation']):
-            if corr > 0.7:
-                bar.set_color('green')
-            elif corr > 0.3:
-                bar.set_color('orange')
-            else:
-                bar.set_color('red')
+        colors = np.where(corr_values > 0.7, 'green', np.where(corr_values > 0.3, 'orange', 'red'))
+        for bar, color in zip(bars, colors):
+            bar.set_color(color)
     
     plt.tight_layout(pad=2.5)
     plt.savefig(output_dir / 'model_comparison_overview.png', dpi=300, bbox_inches='tight', 
@@ -303,8 +383,6 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
     fig, axes = plt.subplots(2, 3, figsize=(14, 9))
     fig.suptitle('Detailed Sentiment Fields Comparison', fontsize=13, fontweight='bold', y=0.98)
     
-    numeric_fields = ['polarity', 'stress_score', 'uncertainty_score', 'helpfulness', 'toxicity_score']
-    
     for i, field in enumerate(numeric_fields):
         row = i // 3
         col = i % 3
@@ -312,12 +390,12 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
         col1 = f'{model_names[0]}_{field}'
         col2 = f'{model_names[1]}_{field}'
         
-        if col1 in df.columns and col2 in df.columns:
-            axes[row, col].scatter(df[col1], df[col2], alpha=0.6, s=20)
+        if col1 in arrs and col2 in arrs:
+            axes[row, col].scatter(arrs[col1], arrs[col2], alpha=0.6, s=20)
             
             # Add diagonal line
-            min_val = min(df[col1].min(), df[col2].min())
-            max_val = max(df[col1].max(), df[col2].max())
+            min_val = min(np.nanmin(arrs[col1]), np.nanmin(arrs[col2]))
+            max_val = max(np.nanmax(arrs[col1]), np.nanmax(arrs[col2]))
             axes[row, col].plot([min_val, max_val], [min_val, max_val], 'r--', alpha=0.7)
             
             axes[row, col].set_xlabel(f'{model_names[0]} {field}')
@@ -326,9 +404,8 @@ def create_visualizations(df: pd.DataFrame, model_names: List[str], output_dir:
             axes[row, col].grid(True, alpha=0.3)
             
             # Add correlation text
-            valid_data = df[[col1, col2]].dropna()
-            if len(valid_data) > 1:
-                corr = pearsonr(valid_data[col1], valid_data[col2])[0]
+            if field in correlations:
+                corr = correlations[field]['pearson']
                 axes[row, col].text(0.05, 0.95, f'r = {corr:.3f}', 
                                   transform=axes[row, col].transAxes, 
                                   bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
@@ -437,6 +514,20 @@ def create_summary_report(stats: Dict, correlations: Dict, most_different: List[
     
     return "\n".join(report)
 
+def write_aligned_csv(df: pd.DataFrame, csv_path: str) -> None:
+    """Write the aligned table as CSV, with PyArrow's writer when it can type every column."""
+    if pa:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # Mixed object columns, e.g. positional int ids next to string ids
+            table = None
+        if table is not None:
+            pacsv.write_csv(table, csv_path)
+            return
+    with open(csv_path, 'w', encoding='utf-8', newline='', buffering=4 * IO_BUFFER_SIZE) as f:
+        df.to_csv(f, index=False)
+
 def main():
     parser = argparse.ArgumentParser(description='Compare sentiment analysis results between models')
     parser.add_argument('--eval-dir', default='./Evaluation', help='Directory containing evaluation files')
@@ -476,7 +567,7 @@ def main():
     
     # Create visualizations
     logging.info("Creating visualizations...")
-    create_visualizations(df, model_names, Path('./plots'))
+    create_visualizations(df, model_names, Path('./plots'), correlations)
     
     # Generate report
     logging.info("Generating report...")
@@ -492,32 +583,33 @@ def main():
         'summary_report': report
     }
     
-    # Convert numpy types to native Python types for JSON serialization
-    def convert_numpy(obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, dict):
-            return {key: convert_numpy(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_numpy(item) for item in obj]
-        return obj
-    
-    results_serializable = convert_numpy(results)
-    
-    # Save JSON
-    with open(f'{output_path}.json', 'w', encoding='utf-8') as f:
-        json.dump(results_serializable, f, ensure_ascii=False, indent=2)
+    # Save JSON (orjson serializes numpy scalars/arrays natively)
+    if orjson:
+        with open(f'{output_path}.json', 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2
+                                 | orjson.OPT_NON_STR_KEYS))
+    else:
+        # Convert numpy types to native Python types as the encoder reaches them
+        def convert_numpy(obj):
+            if isinstance(obj, np.integer):
+                return int(obj)
+            elif isinstance(obj, np.floating):
+                return float(obj)
+            elif isinstance(obj, np.bool_):
+                return bool(obj)
+            elif isinstance(obj, np.ndarray):
+                return obj.tolist()
+            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+        
+        with open(f'{output_path}.json', 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, default=convert_numpy)
     
     # Save report
     with open(f'{output_path}_report.md', 'w', encoding='utf-8') as f:
         f.write(report)
     
     # Save CSV for further analysis
-    df.to_csv(f'{output_path}_aligned_data.csv', index=False, encoding='utf-8')
+    write_aligned_csv(df, f'{output_path}_aligned_data.csv')
     
     logging.info(f"Results saved to {output_path}.json, {output_path}_report.md, and {output_path}_aligned_data.csv")
     
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import compare_models_sentiment as cms  # noqa: E402
+
+
+def _results(polarity):
+    # One message with an API id, one without (matched by position)
+    return [
+        {"message_id": "msg-a", "body": "hello", "polarity": polarity},
+        {"body": "no id here", "polarity": -polarity, "gratitude": True},
+    ]
+
+
+@pytest.fixture
+def mixed_id_frame():
+    return cms.align_messages({"m1": _results(0.5), "m2": _results(0.25)})
+
+
+def _expected(df, tmp_path):
+    path = tmp_path / "expected.csv"
+    df.to_csv(path, index=False)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def test_write_aligned_csv_mixed_ids(mixed_id_frame, tmp_path):
+    assert {type(v) for v in mixed_id_frame["message_id"]} == {int, str}
+    out = tmp_path / "aligned.csv"
+
+    cms.write_aligned_csv(mixed_id_frame, str(out))
+
+    got = pd.read_csv(out, dtype=str, keep_default_na=False)
+    expected = _expected(mixed_id_frame, tmp_path)
+    assert list(got.columns) == list(expected.columns)
+    assert got["message_id"].tolist() == ["msg-a", "1"]
+    assert got["m2_polarity"].astype(float).tolist() == [0.25, -0.25]
+
+
+def test_write_aligned_csv_without_pyarrow(mixed_id_frame, tmp_path, monkeypatch):
+    monkeypatch.setattr(cms, "pa", None)
+    out = tmp_path / "aligned.csv"
+
+    cms.write_aligned_csv(mixed_id_frame, str(out))
+
+    got = pd.read_csv(out, dtype=str, keep_default_na=False)
+    pd.testing.assert_frame_equal(got, _expected(mixed_id_frame, tmp_path))
+
+
+def test_write_aligned_csv_string_ids_round_trip(tmp_path):
+    results = [{"message_id": f"id-{i}", "polarity": i / 10} for i in range(3)]
+    df = cms.align_messages({"m1": results, "m2": results})
+    out = tmp_path / "aligned.csv"
+
+    cms.write_aligned_csv(df, str(out))
+
+    got = pd.read_csv(out)
+    assert got["message_id"].tolist() == ["id-0", "id-1", "id-2"]
+    assert got["m1_polarity"].tolist() == [0.0, 0.1, 0.2]
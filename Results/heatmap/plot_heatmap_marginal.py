@@ -13,44 +13,141 @@ showing how emotions change over the semester weeks.
 @Example: python plot_heatmap_marginal.py --csv weekly_sentiment_metrics.csv --output weekly_emotion_heatmap_marginal.png
 """
 
+import argparse
+import os
+import textwrap
+from pathlib import Path
+
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+from matplotlib.cm import ScalarMappable
+from matplotlib.colorbar import Colorbar
+from matplotlib.font_manager import FontProperties
 from matplotlib.gridspec import GridSpec
 
+try:
+    import numba  # optional JIT for large emotion matrices
+except ImportError:
+    numba = None
+
+# Non-emotion columns of the weekly CSV that the plot and summary use
+NEEDED_COLUMNS = {
+    "week_number",
+    "week_start",
+    "week_end",
+    "total_messages",
+    "avg_stress",
+}
+
+# Below this many cells the pandas mean + sort is faster than calling the JIT kernel
+NUMBA_MIN_SIZE = 10_000
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _mean_argsort_desc(a):
+        """Row means (skipping NaNs) and the row order by descending mean."""
+        n_rows, n_cols = a.shape
+        means = np.empty(n_rows, dtype=np.float64)
+        for i in range(n_rows):
+            total = 0.0
+            count = 0
+            for j in range(n_cols):
+                value = a[i, j]
+                if not np.isnan(value):
+                    total += value
+                    count += 1
+            means[i] = total / count if count else np.nan
+        return means, np.argsort(-means, kind="mergesort")
+
+
+def _is_current_cache(df):
+    """True if a cached frame has exactly the columns and dtypes we'd parse now."""
+    emotion_cols = [
+        c for c in df.columns if c.startswith("emotion_") and c.endswith("_pct")
+    ]
+    return (
+        set(df.columns) == NEEDED_COLUMNS | set(emotion_cols)
+        and bool(emotion_cols)
+        and df["week_number"].dtype == np.int32
+        and df["total_messages"].dtype == np.int64
+        and df["avg_stress"].dtype == np.float64
+        and all(df[c].dtype == np.float64 for c in emotion_cols)
+    )
+
 
 def load_sentiment_data(csv_file):
-    """Load the weekly sentiment CSV and extract what we need."""
-    df = pd.read_csv(csv_file)
+    """Load the weekly sentiment CSV and extract what we need.
+
+    The parsed table is cached next to the CSV as <csv>.parquet, so later runs
+    skip CSV parsing as long as the CSV hasn't changed since.
+    """
+    cache = Path(str(csv_file) + ".parquet")
+    if cache.exists() and cache.stat().st_mtime >= os.path.getmtime(csv_file):
+        try:
+            cached = pd.read_parquet(cache)
+        except (ImportError, OSError, ValueError):
+            cached = None  # no parquet engine or unreadable file: use the CSV
+        if cached is not None and _is_current_cache(cached):
+            return cached
+
+    # Parse only the columns the plot uses. The percentages and stress stay
+    # float64: they are printed on the figure and in the summary, and float32
+    # rounds 2-decimal values like 19.55 differently
+    df = pd.read_csv(
+        csv_file,
+        usecols=lambda col: col in NEEDED_COLUMNS
+        or (col.startswith("emotion_") and col.endswith("_pct")),
+        dtype={
+            "week_number": "int32",
+            "total_messages": "int64",
+            "avg_stress": "float64",
+        },
+    )
+    # Columns that happen to hold only integers (e.g. all 0) would parse as
+    # int64; pin them so a fresh parse always matches _is_current_cache
+    emotion_cols = df.filter(regex=r"^emotion_.*_pct$").columns
+    df[emotion_cols] = df[emotion_cols].astype(np.float64)
+    try:
+        df.to_parquet(cache, compression="zstd")
+    except (ImportError, OSError):
+        pass  # caching is optional
     return df
 
 
 def extract_emotion_matrix(df):
     """Pull out emotion columns and make them into a matrix for plotting."""
     # Find all the emotion percentage columns
-    emotion_cols = [
-        col for col in df.columns if col.startswith("emotion_") and col.endswith("_pct")
-    ]
-
-    # Flip it so emotions are rows instead of columns
-    emotion_data = df[emotion_cols].T
+    emotion_cols = df.filter(regex=r"^emotion_.*_pct$")
 
     # Clean up the names - remove the prefixes/suffixes
-    emotion_names = [
-        col.replace("emotion_", "").replace("_pct", "") for col in emotion_cols
-    ]
-    emotion_data.index = emotion_names
-    emotion_data.columns = df["week_number"]
+    emotion_names = (
+        emotion_cols.columns.str.replace("emotion_", "", regex=False)
+        .str.replace("_pct", "", regex=False)
+        .tolist()
+    )
+
+    # Flip it so emotions are rows (weeks are columns, in df order)
+    # Kept float64: the cell labels are formatted from these values
+    emotion_data = emotion_cols.to_numpy().T
 
     return emotion_data, emotion_names
 
 
-def sort_emotions_by_frequency(emotion_data):
+def sort_emotions_by_frequency(emotion_data, emotion_names):
     """Sort emotions so most common ones appear at the top of heatmap."""
-    emotion_averages = emotion_data.mean(axis=1).sort_values(ascending=False)
-    emotion_data_sorted = emotion_data.reindex(emotion_averages.index)
-    emotion_names_sorted = emotion_averages.index.tolist()
+    if numba is not None and emotion_data.size > NUMBA_MIN_SIZE:
+        arr = np.ascontiguousarray(emotion_data, dtype=np.float64)
+        means, order = _mean_argsort_desc(arr)
+    else:
+        means = np.nanmean(emotion_data, axis=1)
+        order = np.argsort(-means, kind="stable")
+    emotion_data_sorted = emotion_data[order]
+    emotion_names_sorted = [emotion_names[i] for i in order]
+    emotion_averages = pd.Series(means[order], index=emotion_names_sorted)
 
-    return emotion_data_sorted, emotion_names_sorted
+    return emotion_data_sorted, emotion_names_sorted, emotion_averages
 
 
 def setup_figure_layout():
@@ -76,10 +173,14 @@ def setup_figure_layout():
 
 def create_main_heatmap(ax_main, emotion_data, emotion_names, df):
     """Draw the main emotion heatmap with all the percentage values."""
+    # Colormap the percentages once into uint8 RGBA so imshow skips norm + cmap on draw
+    values = emotion_data.astype(np.float32, copy=False)
+    # nan-aware limits: a missing week must not blank the whole heatmap
+    norm = plt.Normalize(vmin=np.nanmin(values), vmax=np.nanmax(values))
+    rgba = (plt.get_cmap("viridis")(norm(values)) * 255).astype(np.uint8)
+
     # Create the actual heatmap
-    im = ax_main.imshow(
-        emotion_data.values, aspect="auto", cmap="viridis", interpolation="nearest"
-    )
+    ax_main.imshow(rgba, aspect="auto", interpolation="nearest")
 
     # Set up tick labels
     ax_main.set_xticks(range(len(df)))
@@ -91,41 +192,48 @@ def create_main_heatmap(ax_main, emotion_data, emotion_names, df):
     ax_main.set_xlabel("Week Number", fontsize=12, fontweight="bold")
     ax_main.set_ylabel("Emotion Type", fontsize=12, fontweight="bold")
 
-    return im
+    # Mappable in percentage units for the colorbar
+    return ScalarMappable(norm=norm, cmap="viridis")
 
 
 def add_heatmap_annotations(ax_main, emotion_data, emotion_names, df):
     """Put the percentage numbers on each heatmap cell."""
-    # Add white text on each cell
-    for i in range(len(emotion_names)):
-        for j in range(len(df)):
-            value = emotion_data.iloc[i, j]
-            if value > 0:  # only show when there's actually some percentage
-                ax_main.text(
-                    j,
-                    i,
-                    f"{value:.1f}",
-                    ha="center",
-                    va="center",
-                    color="white",
-                    fontsize=8,
-                    fontweight="bold",
-                )
+    # Find the cells that actually have some percentage
+    rows, cols = np.nonzero(emotion_data > 0)
+    labels = np.char.mod("%.1f", emotion_data)[rows, cols]
+
+    # Add white text on each cell, sharing one font instead of rebuilding it per cell
+    font = FontProperties(size=8, weight="bold")
+    for j, i, label in zip(cols, rows, labels):
+        ax_main.text(
+            j,
+            i,
+            label,
+            ha="center",
+            va="center",
+            color="white",
+            fontproperties=font,
+            rotation=0,
+        )
 
 
 def create_stress_timeline(ax_top, df):
     """Create the stress progression plot at the top."""
+    # Shared x positions and stress values for the line and the fill
+    x = np.arange(len(df), dtype=np.int32)
+    y = df["avg_stress"].to_numpy(dtype=np.float32)
+
     # Plot stress line with markers
     ax_top.plot(
-        range(len(df)),
-        df["avg_stress"],
+        x,
+        y,
         color="red",
         linewidth=3,
         marker="o",
         markersize=6,
     )
     # Fill underneath for visual effect
-    ax_top.fill_between(range(len(df)), df["avg_stress"], alpha=0.3, color="red")
+    ax_top.fill_between(x, y, 0, alpha=0.3, color="red")
 
     # Styling
     ax_top.set_ylabel("Avg Stress", fontsize=11, fontweight="bold", color="red")
@@ -169,7 +277,7 @@ def create_complete_visualization(df, emotion_data, emotion_names):
     fig, ax_main, ax_top, ax_cbar = setup_figure_layout()
 
     # Create main heatmap
-    im = create_main_heatmap(ax_main, emotion_data, emotion_names, df)
+    mappable = create_main_heatmap(ax_main, emotion_data, emotion_names, df)
 
     # Add percentage annotations
     add_heatmap_annotations(ax_main, emotion_data, emotion_names, df)
@@ -177,61 +285,87 @@ def create_complete_visualization(df, emotion_data, emotion_names):
     # Create stress timeline
     create_stress_timeline(ax_top, df)
 
-    # Add colorbar
-    cbar = plt.colorbar(im, cax=ax_cbar)
+    # Add colorbar with ticks spread over the known percentage range
+    norm = mappable.norm
+    cbar = Colorbar(
+        ax_cbar, mappable, ticks=np.linspace(norm.vmin, norm.vmax, 5), format="%.1f"
+    )
     cbar.set_label("Emotion Percentage (%)", fontsize=11, fontweight="bold")
 
     # Final titles and labels
     add_titles_and_labels(fig, df)
 
-    plt.tight_layout()
+    # Layout is fixed by the GridSpec spacing; tight_layout can't handle these
+    # axes anyway and only cost an extra measurement render
     return fig
 
 
-def print_analysis_summary(df, emotion_data):
+def print_analysis_summary(df, emotion_data, emotion_averages):
     """Print some basic stats about what we found in the data."""
     print("\n--- Quick Analysis Summary ---")
     print(f"Analyzed {len(df)} weeks of data")
     print(f"Found {len(emotion_data)} different emotion types")
 
     # Find week with highest/lowest stress
-    max_stress_week = df.loc[df["avg_stress"].idxmax(), "week_number"]
-    min_stress_week = df.loc[df["avg_stress"].idxmin(), "week_number"]
-    print(f"Most stressful week: Week {max_stress_week} ({df['avg_stress'].max():.3f})")
-    print(
-        f"Least stressful week: Week {min_stress_week} ({df['avg_stress'].min():.3f})"
-    )
-
-    # Show top emotions
-    emotion_totals = emotion_data.mean(axis=1).sort_values(ascending=False)
+    stress = df["avg_stress"].to_numpy()
+    imax, imin = int(np.nanargmax(stress)), int(np.nanargmin(stress))
+    max_stress_week = df["week_number"].iat[imax]
+    min_stress_week = df["week_number"].iat[imin]
+    print(f"Most stressful week: Week {max_stress_week} ({stress[imax]:.3f})")
+    print(f"Least stressful week: Week {min_stress_week} ({stress[imin]:.3f})")
+
+    # Show top emotions (already averaged and sorted by sort_emotions_by_frequency)
     print("\nTop emotions throughout semester:")
-    for i, (emotion, avg_pct) in enumerate(emotion_totals.head(3).items()):
-        print(f"  {i+1}. {emotion}: {avg_pct:.1f}%")
+    top3 = emotion_averages.head(3)
+    top3.index = [f"{i+1}. {emotion}:" for i, emotion in enumerate(top3.index)]
+    table = top3.to_string(header=False, float_format="{:.1f}%".format)
+    print(textwrap.indent(table, "  "))
 
 
 def main():
     """Main function - loads data, creates visualization, saves it."""
-    csv_file = "weekly_sentiment_metrics.csv"
-    output_file = "weekly_emotion_heatmap_marginal.png"
+    parser = argparse.ArgumentParser(
+        description="Plot the weekly emotion heatmap with the stress timeline."
+    )
+    parser.add_argument(
+        "--csv", default="weekly_sentiment_metrics.csv", help="Weekly sentiment CSV"
+    )
+    parser.add_argument(
+        "--output", default="weekly_emotion_heatmap_marginal.png", help="Output image"
+    )
+    parser.add_argument(
+        "--show", action="store_true", help="Also open the figure in a window"
+    )
+    args = parser.parse_args()
+
+    csv_file = args.csv
+    output_file = args.output
 
     print("Loading sentiment data...")
     df = load_sentiment_data(csv_file)
 
     print("Processing emotion data...")
     emotion_data, emotion_names = extract_emotion_matrix(df)
-    emotion_data, emotion_names = sort_emotions_by_frequency(emotion_data)
+    emotion_data, emotion_names, emotion_averages = sort_emotions_by_frequency(
+        emotion_data, emotion_names
+    )
 
     print("Creating visualization...")
     fig = create_complete_visualization(df, emotion_data, emotion_names)
 
-    # Save the plot
-    plt.savefig(output_file, dpi=300, bbox_inches="tight", facecolor="white")
+    # Save the plot, measuring the tight bounds once up front (with the same 0.1"
+    # padding "tight" uses) instead of letting savefig measure them itself
+    bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(0.1)
+    fig.savefig(output_file, dpi=300, bbox_inches=bbox, facecolor="white")
     print(f"Saved visualization as: {output_file}")
 
     # Show some insights
-    print_analysis_summary(df, emotion_data)
+    print_analysis_summary(df, emotion_data, emotion_averages)
 
-    plt.show()
+    if args.show:
+        plt.show()
+    # Free the figure's render buffers
+    plt.close(fig)
 
 
 if __name__ == "__main__":
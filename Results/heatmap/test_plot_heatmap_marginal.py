@@ -0,0 +1,101 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import plot_heatmap_marginal as phm  # noqa: E402
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def weekly_csv(tmp_path):
+    csv_file = tmp_path / "weekly.csv"
+    pd.DataFrame(
+        {
+            "week_number": [1, 2, 3],
+            "week_start": ["2025-01-01", "2025-01-08", "2025-01-15"],
+            "week_end": ["2025-01-07", "2025-01-14", "2025-01-21"],
+            "total_messages": [10, 20, 30],
+            "avg_stress": [0.1235, 0.5, 0.25],
+            "emotion_humor_pct": [19.55, 12.35, 26.95],
+            "emotion_anger_pct": [0, 0, 0],  # all-integer column
+            "unused": ["x", "y", "z"],
+        }
+    ).to_csv(csv_file, index=False)
+    return csv_file
+
+
+def _age(path, seconds):
+    st = path.stat()
+    os.utime(path, (st.st_atime - seconds, st.st_mtime - seconds))
+
+
+def test_sidecar_written_and_reused(weekly_csv):
+    cache = Path(str(weekly_csv) + ".parquet")
+    first = phm.load_sentiment_data(weekly_csv)
+    assert cache.exists()
+    assert "unused" not in first
+    assert first["emotion_anger_pct"].dtype == np.float64
+
+    # An older CSV keeps the sidecar valid: it is read back, not rewritten
+    _age(weekly_csv, 60)
+    mtime = cache.stat().st_mtime_ns
+    second = phm.load_sentiment_data(weekly_csv)
+    assert cache.stat().st_mtime_ns == mtime
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_unrelated_stem_parquet_is_ignored(weekly_csv):
+    unrelated = weekly_csv.with_suffix(".parquet")
+    pd.DataFrame({"x": [1]}).to_parquet(unrelated)
+
+    df = phm.load_sentiment_data(weekly_csv)
+
+    assert "x" not in df
+    assert pd.read_parquet(unrelated).columns.tolist() == ["x"]
+
+
+def test_stale_sidecar_is_reparsed(weekly_csv):
+    cache = Path(str(weekly_csv) + ".parquet")
+    stale = phm.load_sentiment_data(weekly_csv).astype({"emotion_humor_pct": "float32"})
+    stale.to_parquet(cache)
+    _age(weekly_csv, 60)
+
+    df = phm.load_sentiment_data(weekly_csv)
+
+    assert df["emotion_humor_pct"].dtype == np.float64
+    assert phm._is_current_cache(pd.read_parquet(cache))
+
+
+def test_cell_labels_match_csv_values(weekly_csv):
+    df = phm.load_sentiment_data(weekly_csv)
+    emotion_data, names = phm.extract_emotion_matrix(df)
+
+    labels = np.char.mod("%.1f", emotion_data[names.index("humor")])
+
+    assert labels.tolist() == ["19.6", "12.3", "26.9"]
+
+
+def test_heatmap_ignores_missing_values():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    data = np.array([[10.0, np.nan, 30.0], [0.0, 20.0, 5.0]])
+    df = pd.DataFrame({"week_number": [1, 2, 3]})
+    fig, ax = plt.subplots()
+
+    mappable = phm.create_main_heatmap(ax, data, ["a", "b"], df)
+
+    assert (mappable.norm.vmin, mappable.norm.vmax) == (0.0, 30.0)
+    rgba = ax.get_images()[0].get_array()
+    assert rgba[0, 1, 3] == 0  # missing cell is transparent
+    assert (rgba[[0, 1], [0, 2], 3] == 255).all()  # others are drawn
+    plt.close(fig)
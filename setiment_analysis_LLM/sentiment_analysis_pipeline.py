@@ -5,47 +5,104 @@ annotate_sentiment_batched.py
 Simplified, fast batched annotator for WhatsApp group messages.
 
 What’s simplified
-- Always sends messages to the LLM in **batches of 10** (single HTTP call returns an array of 10 JSON objects).
-- Concurrency is controlled by **--num-workers** (default=4).
+- Sends messages to the LLM in **batches of --batch-size** (default=16; single HTTP call returns an array of
+  that many JSON objects). Batches over --max-tokens-per-batch are halved until they fit.
+- The batch size adapts to the API: it halves when the p95 latency of recent calls exceeds
+  --target-latency or calls start failing, and grows by 2 (up to 32) while calls are fast.
+- Concurrency is controlled by **--num-workers** (default=4): that many batches are
+  in flight at once on a single asyncio event loop. One AsyncOpenAI client (and its
+  keep-alive connection pool) is shared by all files of a run.
 - If an LLM batch parse fails, we **fallback to heuristics** for that batch (keeps things moving).
+- Prompt prefix caching: the system prompt and the user instructions are byte-identical
+  across calls and sent first; only the message lines vary. Models with automatic prefix
+  caching (gpt-4o, gpt-4o-mini, gpt-4.1, gpt-5, o-series) get one warm-up call per run,
+  but only once the prefix reaches the 1024 tokens OpenAI needs before it caches anything.
 
 Still included
 - Enum emotion + free-form `emotion_summary` (1–2 words).
 - Evidence terms (LLM asked explicitly) + heuristic fallback.
 - Reactions-aware polarity nudge, gratitude/help/info/stress detection, toxicity heuristic.
 - Deterministic post-pass to smooth polarity and reconcile fields.
-- Exports sidecar `.sentiment.json` per input and optional combined CSV.
+- Exports sidecar `.sentiment.json` per input and optional combined Parquet (or CSV with --csv-compat).
+- LLM annotations are cached in `.sentiment_cache.sqlite` next to the input, keyed by
+  model + prompt version + body + reactions, so repeated texts ("תודה!", "??") skip the
+  LLM (--no-cache). --no-resume ignores cached annotations too (but refreshes them).
 
 Usage
 -----
 python annotate_sentiment_batched.py --input /path/to/chat.json --model gpt-4o-mini
-python annotate_sentiment_batched.py --input ./folder_of_chats --combined-csv ./labels.csv --num-workers 8
+python annotate_sentiment_batched.py --input ./folder_of_chats --combined-csv ./labels.csv --num-workers 8   # writes labels.parquet
 python annotate_sentiment_batched.py --input chat.json --dry-run   # heuristics only, no LLM calls
+python annotate_sentiment_batched.py --input ./folder_of_chats --offline-batch   # OpenAI Batch API (50% cost, <=24h)
 
 Requires
 --------
 - Python 3.9+
 - pip install openai
+- optional: pip install pyahocorasick  (single-pass keyword scan; regex fallback otherwise)
+- optional: pip install tiktoken  (exact prompt token counts; rough estimate otherwise)
+- optional: pip install ijson  (streams `messages` out of large exports)
+- optional: pip install orjson  (faster JSON parsing/serialization; stdlib json otherwise)
+- optional: pip install pyarrow  (combined Parquet output; CSV otherwise)
 - export OPENAI_API_KEY=sk-...
 
 """
 
 import argparse
+import asyncio
 import csv
+import hashlib
 import json
 import logging
 import os
 import re
+import sqlite3
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tempfile
+import time
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+try:
+    import ahocorasick  # optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import tiktoken  # optional: exact token counts for --max-tokens-per-batch
+except ImportError:
+    tiktoken = None
+
+try:
+    import ijson  # optional: stream messages instead of loading the whole export
+except ImportError:
+    ijson = None
+
+try:
+    import orjson  # optional: faster JSON read/write of chats and annotation files
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa  # optional: combined output as Parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 # ----------------------------
 # Configuration & Schema
 # ----------------------------
 
-BATCH_SIZE = 3  # fixed, per user request
+CACHE_FILENAME = ".sentiment_cache.sqlite"
+
+AUTOSAVE_INTERVAL = 10.0  # seconds between partial saves (--autosave-interval)
+
+BATCH_SIZE = 16  # default for --batch-size
+MAX_BATCH_SIZE = 32  # adaptive batching never grows past this (or --batch-size)
+TARGET_BATCH_LATENCY = 30.0  # seconds, p95 per LLM call (--target-latency)
+MAX_TOKENS_PER_BATCH = 12000  # default for --max-tokens-per-batch (prompt side)
 
 SCHEMA_DEFAULTS = {
     "polarity": 0.0,  # -1..+1
@@ -62,6 +119,15 @@ SCHEMA_DEFAULTS = {
     "evidence_terms": [],  # up to 5 spans from the message
 }
 
+# Numeric fields and their ranges; raw values are coerced/clamped in one pass
+SCORE_BOUNDS = {
+    "polarity": (-1.0, 1.0),
+    "stress_score": (0.0, 1.0),
+    "uncertainty_score": (0.0, 1.0),
+    "helpfulness": (0.0, 1.0),
+    "toxicity_score": (0.0, 1.0),
+}
+
 ALLOWED_EMOTIONS = {
     "stress",
     "gratitude",
@@ -229,6 +295,10 @@ EMOJI_NEGATIVE = {  # Dislike / Anger / Sadness / Fear / Disgust
     "🖕",
 }
 
+# Frozen copies for the per-reaction lookups
+EMOJI_POS_FS = frozenset(EMOJI_POSITIVE)
+EMOJI_NEG_FS = frozenset(EMOJI_NEGATIVE)
+
 
 THANKS_TOKENS_HE = ["תודה", "תודה רבה", "תודה לכולם", "תודהה", "תודההה"]
 HELP_TOKENS_HE = [
@@ -280,13 +350,73 @@ HUMOR_TOKENS_EN = ["lol", "lmao", "haha", "😂", "😅"]
 # Toxicity lexicon (minimal)
 TOX_HE = ["מפגר", "דפוק", "טיפש", "סתום", "חרא", "מנייאק"]
 TOX_EN = ["idiot", "stupid", "dumb", "moron", "wtf", "bs", "shit", "asshole", "fuck"]
+ANGER_EMOJI = ["👎", "🤬", "💢"]
+
+
+def _token_alternation(token_lists: List[List[str]]) -> str:
+    """Regex alternation over all tokens; matched against the lowercased body."""
+    return "|".join(re.escape(t.lower()) for lst in token_lists for t in lst)
+
+
+# Keyword categories as bits of one mask per message
+THANKS_MASK = 1 << 0
+HELP_MASK = 1 << 1
+INFO_MASK = 1 << 2
+STRESS_MASK = 1 << 3
+HUMOR_MASK = 1 << 4
+TOX_MASK = 1 << 5
+QUESTION_MASK = 1 << 6  # "?"
+URL_MASK = 1 << 7  # http:// or https://
+SHOUT_MASK = 1 << 8  # "!!!"
+ANGER_MASK = 1 << 9  # 👎 / 🤬 / 💢
+
+# Hebrew and emoji tokens are caseless, so each category (HE + EN fused) can be
+# matched against the lowercased text; emoji cues are just more needles.
+CATEGORY_TOKENS = [
+    ("thanks", THANKS_MASK, [THANKS_TOKENS_HE, THANKS_TOKENS_EN, ["❤️", "🙏"]]),
+    ("help", HELP_MASK, [HELP_TOKENS_HE, HELP_TOKENS_EN]),
+    ("info", INFO_MASK, [INFO_TOKENS_HE, INFO_TOKENS_EN]),
+    ("stress", STRESS_MASK, [STRESS_TOKENS_HE, STRESS_TOKENS_EN]),
+    ("humor", HUMOR_MASK, [HUMOR_TOKENS_HE, HUMOR_TOKENS_EN]),
+    ("tox", TOX_MASK, [TOX_HE, TOX_EN]),
+    ("anger", ANGER_MASK, [ANGER_EMOJI]),
+]
+CATEGORY_MASKS = {name: mask for name, mask, _ in CATEGORY_TOKENS}
+
+
+def _build_automaton():
+    """Single Aho–Corasick automaton over all category tokens (value = bitmask)."""
+    if ahocorasick is None:
+        return None
+    ac = ahocorasick.Automaton()
+    for _, mask, token_lists in CATEGORY_TOKENS:
+        for lst in token_lists:
+            for tok in lst:
+                tok = tok.lower()
+                ac.add_word(tok, ac.get(tok, 0) | mask)
+    ac.make_automaton()
+    return ac
+
+
+KEYWORD_AC = _build_automaton()
+# Fallback when pyahocorasick is missing: one master regex, a named group per
+# category. The lookahead lets finditer try every position, so tokens overlapping
+# another category's match are still seen; no token is a prefix of a token in
+# another category, so lastgroup is unambiguous.
+CATEGORY_RE = re.compile(
+    "(?="
+    + "|".join(
+        f"(?P<{name}>{_token_alternation(lists)})" for name, _, lists in CATEGORY_TOKENS
+    )
+    + ")"
+)
 
 # ----------------------------
 # Prompting (batched)
 # ----------------------------
 
 SYSTEM_PROMPT = """You are a precise annotator for academic WhatsApp group chats (Hebrew & English).
-Return a JSON ARRAY where each element corresponds to ONE input message in the same order.
+Return a JSON object {"annotations": [...]} whose ARRAY has one element per input message, in the same order.
 Each element must be an object with fields:
 - polarity: float in [-1.0, +1.0] (overall pleasantness).
 - emotion_primary: one of {stress, gratitude, confusion, neutral_info, humor, anger, excitement, other}.
@@ -305,64 +435,223 @@ Guidelines:
 - Questions aren't inherently negative; use stress/uncertainty unless toxic.
 - Gratitude implies positive polarity.
 - Humor (😂/חח/lol) mildly positive but not "gratitude".
-- Output strictly a JSON ARRAY of objects, no prose, no trailing commentary.
+- Output strictly the JSON object with the "annotations" ARRAY, no prose, no trailing commentary.
+"""
+
+# Invariant (cacheable) user prefix; the per-batch part goes in a second user message.
+USER_PREFIX_BATCH = """Annotate the following messages. Return {"annotations": [...]} with a JSON ARRAY of one object per message, in the same order.
 """
 
-USER_TEMPLATE_BATCH = """Annotate the following {n} messages. Return a JSON ARRAY of {n} objects in the same order.
+USER_TEMPLATE_BATCH = """{n} messages:
 
 {lines}
 """
 
-JSON_ARRAY_RE = re.compile(r"\[.*\]\s*$", re.S)
+PREFIX_CACHE_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+PREFIX_CACHE_MIN_TOKENS = 1024  # shorter prefixes are never cached
+
+# OpenAI Batch API (--offline-batch)
+OFFLINE_MAX_REQUESTS = 50000  # per uploaded JSONL, API limit
+OFFLINE_POLL_SECONDS = 30
+OFFLINE_DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Structured Outputs: strict JSON schema for {"annotations": [...]} on models that
+# support it (parseable by construction); JSON mode on the older models that have
+# it; anything else gets no response_format at all (it would be a 400), and
+# _extract_array digs the array out of the free-form reply.
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+JSON_MODE_MODELS = (
+    "gpt-4-turbo",
+    "gpt-4-1106",
+    "gpt-4-0125",
+    "gpt-3.5-turbo-1106",
+    "gpt-3.5-turbo-0125",
+)
+
+
+def _score_schema(field: str) -> Dict[str, Any]:
+    lo, hi = SCORE_BOUNDS[field]
+    return {"type": "number", "minimum": lo, "maximum": hi}
+
+
+ANNOTATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "polarity": _score_schema("polarity"),
+        "emotion_primary": {"type": "string", "enum": sorted(ALLOWED_EMOTIONS)},
+        "emotion_summary": {"type": "string"},
+        "stress_score": _score_schema("stress_score"),
+        "uncertainty_score": _score_schema("uncertainty_score"),
+        "help_request": {"type": "boolean"},
+        "helpfulness": _score_schema("helpfulness"),
+        "gratitude": {"type": "boolean"},
+        "toxicity_score": _score_schema("toxicity_score"),
+        "info_drop": {"type": "boolean"},
+        "reaction_sentiment": {"type": "null"},
+        "evidence_terms": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": list(SCHEMA_DEFAULTS),
+    "additionalProperties": False,
+}
+
+ANNOTATIONS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "annotations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "annotations": {"type": "array", "items": ANNOTATION_SCHEMA}
+            },
+            "required": ["annotations"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def _response_format(model: str) -> Optional[Dict[str, Any]]:
+    if model.startswith(STRUCTURED_OUTPUT_MODELS):
+        return ANNOTATIONS_RESPONSE_FORMAT
+    if model.startswith(JSON_MODE_MODELS):
+        return {"type": "json_object"}
+    return None
+
+
+def _format_kwargs(model: str) -> Dict[str, Any]:
+    """response_format for the request, omitted when the model has none."""
+    fmt = _response_format(model)
+    return {"response_format": fmt} if fmt is not None else {}
+
 
 # ----------------------------
 # OpenAI client
 # ----------------------------
 
 
-def _load_openai_client():
+def _load_openai_client(max_connections: int = 0):
+    """One AsyncOpenAI per run; max_connections > 0 sizes its keep-alive pool."""
     try:
-        from openai import OpenAI  # type: ignore
+        from openai import AsyncOpenAI  # type: ignore
 
         if not os.getenv("OPENAI_API_KEY"):
             raise RuntimeError("OPENAI_API_KEY not set in environment")
-        return OpenAI()
     except Exception as e:
         logging.warning("OpenAI client not available: %s", e)
         return None
+    if max_connections > 0:
+        try:
+            import httpx  # type: ignore
+            from openai import DefaultAsyncHttpxClient  # type: ignore
+
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            )
+            return AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=limits))
+        except ImportError:
+            pass  # older openai / no httpx: library default pool
+    return AsyncOpenAI()
 
 
-def call_llm_array(
+def _extract_array(content: str) -> Any:
+    """Pull the annotations array out of a JSON reply (or a bare array)."""
+    try:
+        obj = json.loads(content)
+    except ValueError:
+        # Non-strict models may wrap the array in prose; slice outermost [...]
+        start, end = content.find("["), content.rfind("]")
+        if start < 0 or end < start:
+            raise ValueError("No JSON array found in response")
+        return json.loads(content[start : end + 1])
+    if isinstance(obj, dict):
+        # Expected {"annotations": [...]}; tolerate a different key name
+        if isinstance(obj.get("annotations"), list):
+            return obj["annotations"]
+        return next((v for v in obj.values() if isinstance(v, list)), obj)
+    return obj
+
+
+@lru_cache(maxsize=None)
+def _encoding_for(model: str):
+    """tiktoken encoding for the model, or None if not installed/downloadable."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning("tiktoken encoding not available, estimating: %s", e)
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    enc = _encoding_for(model)
+    if enc is None:
+        return len(text) // 2  # conservative for Hebrew-heavy text
+    return len(enc.encode(text))
+
+
+# Error codes meaning "this prompt is too big"; a smaller batch can succeed
+SIZE_ERROR_CODES = ("context_length_exceeded", "string_above_max_length")
+
+
+def _is_context_length_error(e: Exception) -> bool:
+    return getattr(e, "code", None) in SIZE_ERROR_CODES
+
+
+def _is_bad_request(e: Exception) -> bool:
+    """Any other 400 (unsupported parameter, bad model, ...): not about size."""
+    return getattr(e, "status_code", None) == 400
+
+
+def _chat_messages(
+    sys_prompt: str, user_prompt: str, user_prefix: str = ""
+) -> List[Dict[str, str]]:
+    messages = [{"role": "system", "content": sys_prompt}]
+    if user_prefix:
+        messages.append({"role": "user", "content": user_prefix})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+async def call_llm_array(
     client,
     model: str,
     sys_prompt: str,
     user_prompt: str,
     temperature: float = 1.0,
     max_retries: int = 3,
+    user_prefix: str = "",
 ) -> Optional[List[Dict[str, Any]]]:
-    """Call Chat Completions and parse a JSON array; return list of dicts or None."""
+    """Call Chat Completions (structured/JSON mode) and parse the array; return list of dicts or None."""
     if client is None:
         return None
+    messages = _chat_messages(sys_prompt, user_prompt, user_prefix)
     last_err = None
     for i in range(max_retries):
         try:
-            resp = client.chat.completions.create(
+            resp = await client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                messages=messages,
                 temperature=temperature,
+                **_format_kwargs(model),
             )
             content = resp.choices[0].message.content or ""
-            m = JSON_ARRAY_RE.search(content.strip())
-            if not m:
-                raise ValueError("No JSON array found in response")
-            arr = json.loads(m.group(0))
+            arr = _extract_array(content)
             if not isinstance(arr, list):
                 raise ValueError("Parsed content is not a list")
             return arr
         except Exception as e:
+            if _is_context_length_error(e):
+                raise  # retrying the same prompt can't help; caller splits the batch
+            if _is_bad_request(e):
+                # Retrying or splitting resends the same invalid request
+                logging.error("LLM batch rejected, using heuristics: %s", e)
+                return None
             last_err = e
             logging.warning(
                 "LLM batch call failed (attempt %d/%d): %s", i + 1, max_retries, e
@@ -371,21 +660,95 @@ def call_llm_array(
     return None
 
 
-# ----------------------------
-# Utilities & heuristics
-# ----------------------------
+_WARMED_MODELS: set = set()
 
 
-def _norm_float(x: Any, lo=-1.0, hi=1.0, default=0.0) -> float:
+async def warm_prompt_cache(client, model: str) -> None:
+    """Send the invariant prompt prefix once so later batches hit the prefix cache."""
+    if client is None or model in _WARMED_MODELS:
+        return
+    _WARMED_MODELS.add(model)
+    if not model.startswith(PREFIX_CACHE_MODELS):
+        return
+    # The warm-up is a billed call; it only pays off if the prefix is cacheable
+    if count_tokens(SYSTEM_PROMPT + USER_PREFIX_BATCH, model) < PREFIX_CACHE_MIN_TOKENS:
+        return
     try:
-        v = float(x)
-        return max(lo, min(hi, v))
-    except Exception:
-        return float(default)
+        await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": USER_PREFIX_BATCH},
+            ],
+            **_format_kwargs(model),  # the schema is part of the prefix
+            max_completion_tokens=1,
+        )
+    except Exception as e:
+        logging.info("Prompt cache warm-up skipped: %s", e)
+
 
+# ----------------------------
+# Utilities & heuristics
+# ----------------------------
 
-def _norm_float01(x: Any, default=0.0) -> float:
-    return _norm_float(x, lo=0.0, hi=1.0, default=default)
+
+class SentimentRow:
+    """Working annotation for one message while heuristics run.
+
+    Slotted attributes instead of a fresh SCHEMA_DEFAULTS dict per message;
+    as_dict() builds the output row (same keys, same order) once at the end.
+    """
+
+    __slots__ = tuple(SCHEMA_DEFAULTS)
+
+    def __init__(self, base: Optional[Dict[str, Any]] = None) -> None:
+        # Defaults mirror SCHEMA_DEFAULTS
+        self.polarity = 0.0
+        self.emotion_primary = "neutral_info"
+        self.emotion_summary = ""
+        self.stress_score = 0.0
+        self.uncertainty_score = 0.0
+        self.help_request = False
+        self.helpfulness = 0.0
+        self.gratitude = False
+        self.toxicity_score = 0.0
+        self.info_drop = False
+        self.reaction_sentiment = None
+        self.evidence_terms = []
+        if base:
+            for k, v in base.items():
+                if k in SCHEMA_DEFAULTS:
+                    setattr(self, k, v)
+            self._clamp_scores()
+
+    def _clamp_scores(self) -> None:
+        """Coerce every SCORE_BOUNDS field to a float within its range."""
+        for k, (lo, hi) in SCORE_BOUNDS.items():
+            v = getattr(self, k)
+            if type(v) is not float:
+                try:
+                    v = float(v)
+                except (TypeError, ValueError):
+                    v = SCHEMA_DEFAULTS[k]
+            if v != v:  # NaN
+                v = SCHEMA_DEFAULTS[k]
+            setattr(self, k, lo if v < lo else hi if v > hi else v)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "polarity": self.polarity,
+            "emotion_primary": self.emotion_primary,
+            "emotion_summary": self.emotion_summary,
+            "stress_score": self.stress_score,
+            "uncertainty_score": self.uncertainty_score,
+            "help_request": self.help_request,
+            "helpfulness": self.helpfulness,
+            "gratitude": self.gratitude,
+            "toxicity_score": self.toxicity_score,
+            "info_drop": self.info_drop,
+            "reaction_sentiment": self.reaction_sentiment,
+            "evidence_terms": self.evidence_terms,
+        }
 
 
 def summarize_reactions(
@@ -393,26 +756,38 @@ def summarize_reactions(
 ) -> Optional[Dict[str, int]]:
     if not reacts:
         return None
-    pos = sum(
-        int(r.get("count", 0)) for r in reacts if r.get("emoji") in EMOJI_POSITIVE
-    )
-    neg = sum(
-        int(r.get("count", 0)) for r in reacts if r.get("emoji") in EMOJI_NEGATIVE
-    )
-    neu = sum(
-        int(r.get("count", 0))
-        for r in reacts
-        if r.get("emoji") not in (EMOJI_POSITIVE | EMOJI_NEGATIVE)
-    )
+    pos = neg = neu = 0
+    for r in reacts:
+        e = r.get("emoji")
+        c = int(r.get("count", 0))
+        if e in EMOJI_POS_FS:
+            pos += c
+        elif e in EMOJI_NEG_FS:
+            neg += c
+        else:
+            neu += c
     return {"positive": pos, "neutral": neu, "negative": neg}
 
 
-def _tox_heuristic(text: str) -> float:
-    t = text.lower()
+def _scan_keywords(text_lower: str) -> int:
+    """Bitmask of keyword categories found in the (lowercased) text."""
+    cats = 0
+    if KEYWORD_AC is not None:
+        for _, mask in KEYWORD_AC.iter(text_lower):
+            cats |= mask
+    else:
+        for m in CATEGORY_RE.finditer(text_lower):
+            cats |= CATEGORY_MASKS[m.lastgroup]
+    return cats
+
+
+def _tox_heuristic(text_lower: str, flags: Optional[int] = None) -> float:
+    if flags is None:
+        flags = _scan_keywords(text_lower)
     score = 0.0
-    if any(w in t for w in TOX_EN) or any(w in text for w in TOX_HE):
+    if flags & TOX_MASK:
         score = max(score, 0.5)
-    if any(e in text for e in ("👎", "🤬", "💢")):
+    if flags & ANGER_MASK:
         score = max(score, 0.2)
     return score
 
@@ -424,161 +799,150 @@ def _has_concrete_anchor(text: str) -> bool:
     return bool(ANCHOR_RE.search(text or ""))
 
 
-def _fallback_evidence_terms(out: Dict[str, Any], msg_text: str) -> List[str]:
-    terms = out.get("evidence_terms") or []
+def _fallback_evidence_terms(out: SentimentRow, msg_text: str, flags: int) -> List[str]:
+    terms = out.evidence_terms or []
     if terms:
         return terms[:5]
     cues: List[str] = []
     if "http" in msg_text:
         cues.append("http")
-    if (
-        any(tok in msg_text for tok in THANKS_TOKENS_HE)
-        or any(tok in msg_text.lower() for tok in THANKS_TOKENS_EN)
-        or any(e in msg_text for e in ("🙏", "❤️"))
-    ):
+    if flags & THANKS_MASK:
         cues.append("תודה/❤️/🙏")
-    if "?" in msg_text:
+    if flags & QUESTION_MASK:
         cues.append("?")
     cues.extend(ANCHOR_RE.findall(msg_text)[:2])
-    for w in STRESS_TOKENS_HE + STRESS_TOKENS_EN:
-        if w in msg_text:
-            cues.append(w)
-            break
-    for w in HUMOR_TOKENS_HE + HUMOR_TOKENS_EN:
-        if w in msg_text:
-            cues.append("humor/😂")
-            break
+    # A case-sensitive hit implies a hit in the lowercased scan, so the flags
+    # let us skip these ordered lookups for the vast majority of messages.
+    if flags & STRESS_MASK:
+        for w in STRESS_TOKENS_HE + STRESS_TOKENS_EN:
+            if w in msg_text:
+                cues.append(w)
+                break
+    if flags & HUMOR_MASK:
+        for w in HUMOR_TOKENS_HE + HUMOR_TOKENS_EN:
+            if w in msg_text:
+                cues.append("humor/😂")
+                break
     return list(dict.fromkeys(cues))[:5]
 
 
-def apply_heuristics(base: Dict[str, Any], msg: Dict[str, Any]) -> Dict[str, Any]:
-    out = dict(SCHEMA_DEFAULTS)
-    out.update({k: v for k, v in (base or {}).items() if k in SCHEMA_DEFAULTS})
+def _text_flags(text: str) -> int:
+    """Category bitmask for an already stripped body (lowercased once here)."""
+    cats = _scan_keywords(text.lower())
+    if "?" in text:
+        cats |= QUESTION_MASK
+    if "http://" in text or "https://" in text:
+        cats |= URL_MASK
+    if "!!!" in text:
+        cats |= SHOUT_MASK
+    return cats
+
+
+def scan_text_flags(messages: List[Dict[str, Any]]) -> List[int]:
+    """Pre-pass over message bodies: one category bitmask per message."""
+    return [_text_flags((m.get("body") or "").strip()) for m in messages]
+
+
+def apply_heuristics(
+    base: Dict[str, Any], msg: Dict[str, Any], flags: Optional[int] = None
+) -> SentimentRow:
+    # Raw scores are clamped on construction; the adjustments below stay in range
+    out = SentimentRow(base)
 
     text = (msg.get("body") or "").strip()
+    if flags is None:
+        flags = _text_flags(text)
     reacts = msg.get("reactions") or []
 
     # Reaction sentiment -> small polarity nudge
     rs = summarize_reactions(reacts)
     if rs:
-        out["reaction_sentiment"] = rs
+        out.reaction_sentiment = rs
         total = (rs["positive"] + rs["negative"]) or 1
         bump = 0.1 * (rs["positive"] - rs["negative"]) / total
         bump = max(-0.15, min(0.15, bump))
-        out["polarity"] = max(-1.0, min(1.0, out["polarity"] + bump))
+        out.polarity = max(-1.0, min(1.0, out.polarity + bump))
 
     # Gratitude detection
-    if (
-        any(tok in text for tok in THANKS_TOKENS_HE)
-        or any(tok in text.lower() for tok in THANKS_TOKENS_EN)
-        or any(e in text for e in {"❤️", "🙏"})
-    ):
-        out["gratitude"] = True
-        out["polarity"] = max(out["polarity"], 0.6)
+    if flags & THANKS_MASK:
+        out.gratitude = True
+        out.polarity = max(out.polarity, 0.6)
 
     # Info drop detection
-    if (
-        "http://" in text
-        or "https://" in text
-        or any(tok in text for tok in INFO_TOKENS_HE)
-        or any(tok in text.lower() for tok in INFO_TOKENS_EN)
-    ):
-        out["info_drop"] = True
-        out["helpfulness"] = max(out["helpfulness"], 0.4)
+    if flags & (URL_MASK | INFO_MASK):
+        out.info_drop = True
+        out.helpfulness = max(out.helpfulness, 0.4)
 
     # Help / uncertainty
-    if (
-        "?" in text
-        or any(tok in text for tok in HELP_TOKENS_HE)
-        or any(tok in text.lower() for tok in HELP_TOKENS_EN)
-    ):
-        out["uncertainty_score"] = max(out["uncertainty_score"], 0.6)
-        if (
-            text.strip().startswith(("מישהו", "מישהי"))
-            or any(tok in text for tok in HELP_TOKENS_HE)
-            or any(tok in text.lower() for tok in HELP_TOKENS_EN)
-        ):
-            out["help_request"] = True
+    if flags & (QUESTION_MASK | HELP_MASK):
+        out.uncertainty_score = max(out.uncertainty_score, 0.6)
+        if text.startswith(("מישהו", "מישהי")) or flags & HELP_MASK:
+            out.help_request = True
 
     # Stress
-    if (
-        any(tok in text for tok in STRESS_TOKENS_HE)
-        or any(tok in text.lower() for tok in STRESS_TOKENS_EN)
-        or "!!!" in text
-    ):
-        out["stress_score"] = max(out["stress_score"], 0.6)
-        out["polarity"] = min(out["polarity"], -0.2)
+    if flags & (STRESS_MASK | SHOUT_MASK):
+        out.stress_score = max(out.stress_score, 0.6)
+        out.polarity = min(out.polarity, -0.2)
 
     # Humor
-    if any(tok in text for tok in HUMOR_TOKENS_HE) or any(
-        tok in text.lower() for tok in HUMOR_TOKENS_EN
-    ):
-        if out["emotion_primary"] == "neutral_info":
-            out["emotion_primary"] = "humor"
-        out["polarity"] = max(out["polarity"], 0.2)
-
-    # Toxicity heuristic (rare but important)
-    out["toxicity_score"] = max(
-        _norm_float01(out.get("toxicity_score")), _tox_heuristic(text)
-    )
+    if flags & HUMOR_MASK:
+        if out.emotion_primary == "neutral_info":
+            out.emotion_primary = "humor"
+        out.polarity = max(out.polarity, 0.2)
 
-    # Clamp numeric ranges
-    out["polarity"] = _norm_float(out.get("polarity"))
-    out["stress_score"] = _norm_float01(out.get("stress_score"))
-    out["uncertainty_score"] = _norm_float01(out.get("uncertainty_score"))
-    out["helpfulness"] = _norm_float01(out.get("helpfulness"))
+    # Toxicity heuristic (rare but important); keywords come from flags and the
+    # emoji needles are caseless, so the raw text stands in for text_lower
+    out.toxicity_score = max(out.toxicity_score, _tox_heuristic(text, flags))
 
     # evidence_terms fallback
-    out["evidence_terms"] = _fallback_evidence_terms(out, text)
+    out.evidence_terms = _fallback_evidence_terms(out, text, flags)
 
     # emotion_summary fallback
-    if not out.get("emotion_summary"):
-        if out.get("gratitude"):
-            out["emotion_summary"] = "thankful"
-        elif out.get("help_request"):
-            out["emotion_summary"] = (
-                "stressed" if out.get("stress_score", 0) >= 0.6 else "confused"
-            )
-        elif out.get("info_drop"):
-            out["emotion_summary"] = "informative"
-        elif out.get("emotion_primary") == "humor":
-            out["emotion_summary"] = "playful"
-        elif out.get("toxicity_score", 0) >= 0.5:
-            out["emotion_summary"] = "hostile"
+    if not out.emotion_summary:
+        if out.gratitude:
+            out.emotion_summary = "thankful"
+        elif out.help_request:
+            out.emotion_summary = "stressed" if out.stress_score >= 0.6 else "confused"
+        elif out.info_drop:
+            out.emotion_summary = "informative"
+        elif out.emotion_primary == "humor":
+            out.emotion_summary = "playful"
+        elif out.toxicity_score >= 0.5:
+            out.emotion_summary = "hostile"
         else:
-            out["emotion_summary"] = "neutral"
+            out.emotion_summary = "neutral"
 
     return out
 
 
-def _normalize_postpass(out: Dict[str, Any], msg_text: str) -> Dict[str, Any]:
-    emo = out.get("emotion_primary") or "neutral_info"
+def _normalize_postpass(out: SentimentRow, msg_text: str) -> SentimentRow:
+    emo = out.emotion_primary or "neutral_info"
     if emo not in ALLOWED_EMOTIONS:
         emo = "neutral_info"
 
-    if out.get("gratitude"):
+    if out.gratitude:
         emo = "gratitude"
-        out["polarity"] = max(round(max(out.get("polarity", 0.0), 0.6), 2), 0.6)
-        if not out.get("emotion_summary"):
-            out["emotion_summary"] = "thankful"
-    elif out.get("help_request"):
-        emo = "stress" if out.get("stress_score", 0.0) >= 0.6 else "confusion"
+        out.polarity = max(round(max(out.polarity, 0.6), 2), 0.6)
+        if not out.emotion_summary:
+            out.emotion_summary = "thankful"
+    elif out.help_request:
+        emo = "stress" if out.stress_score >= 0.6 else "confusion"
         cap = 0.4 if _has_concrete_anchor(msg_text) else 0.2
-        out["helpfulness"] = min(out.get("helpfulness", 0.0), cap)
-        if out.get("toxicity_score", 0.0) < 0.2:
-            out["polarity"] = max(-0.2, min(0.2, out.get("polarity", 0.0)))
-        if not out.get("emotion_summary"):
-            out["emotion_summary"] = "stressed" if emo == "stress" else "confused"
+        out.helpfulness = min(out.helpfulness, cap)
+        if out.toxicity_score < 0.2:
+            out.polarity = max(-0.2, min(0.2, out.polarity))
+        if not out.emotion_summary:
+            out.emotion_summary = "stressed" if emo == "stress" else "confused"
 
-    pol = float(out.get("polarity", 0.0))
+    pol = float(out.polarity)
     lo = -1.0 if emo in {"anger"} else -0.8
     hi = 1.0 if emo in {"gratitude"} else 0.8
-    out["polarity"] = round(max(lo, min(hi, pol)), 2)
+    out.polarity = round(max(lo, min(hi, pol)), 2)
 
     # trim emotion_summary to <=2 words
-    es = (out.get("emotion_summary") or "").strip()
-    out["emotion_primary"] = emo
-    out["emotion_summary"] = " ".join(es.split()[:2]) if es else ""
+    es = (out.emotion_summary or "").strip()
+    out.emotion_primary = emo
+    out.emotion_summary = " ".join(es.split()[:2]) if es else ""
     return out
 
 
@@ -592,78 +956,328 @@ def chunked(lst: List[Any], n: int) -> Iterable[List[Any]]:
         yield lst[i : i + n]
 
 
+def _json_compact(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass  # e.g. lone surrogates, which stdlib json passes through
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# "2023-05-01T12:34:56.789Z" -> "2023-05-01T12:34Z": minute precision is enough
+# for the model and keeps more prompt bytes shared between batches.
+ISO_SECONDS_RE = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d):\d\d(?:\.\d+)?")
+
+
+def _prompt_time(ts: Any) -> str:
+    return ISO_SECONDS_RE.sub(r"\1", str(ts)) if ts else ""
+
+
 def build_batch_prompt(batch_msgs: List[Dict[str, Any]]) -> str:
     lines = []
     for i, m in enumerate(batch_msgs, 1):
-        text = json.dumps(m.get("body") or "", ensure_ascii=False)
-        reacts = json.dumps(m.get("reactions") or [], ensure_ascii=False)
-        lines.append(
-            f'{i}) id="{m.get("messageId","")}" time="{m.get("datetime","")}" text={text} reactions={reacts}'
-        )
+        # Empty id/time/reactions are omitted rather than sent as "" / []
+        parts = [f"{i})"]
+        mid = m.get("messageId")
+        if mid:
+            parts.append(f'id="{mid}"')
+        t = _prompt_time(m.get("datetime"))
+        if t:
+            parts.append(f'time="{t}"')
+        parts.append("text=" + _json_compact(m.get("body") or ""))
+        reacts = m.get("reactions")
+        if reacts:
+            parts.append("reactions=" + _json_compact(reacts))
+        lines.append(" ".join(parts))
     return USER_TEMPLATE_BATCH.format(n=len(batch_msgs), lines="\n".join(lines))
 
 
-def annotate_batch_with_llm(
-    client, model: str, batch_msgs: List[Dict[str, Any]]
+async def annotate_batch_with_llm(
+    client, model: str, batch_msgs: List[Dict[str, Any]], max_tokens: int = 0
 ) -> List[Dict[str, Any]]:
     """Returns list of raw LLM dicts (len == batch size) or empty list on failure."""
     prompt = build_batch_prompt(batch_msgs)
-    arr = call_llm_array(client, model, SYSTEM_PROMPT, prompt)
-    if not arr or len(arr) != len(batch_msgs):
+    can_split = len(batch_msgs) > 1
+    if (
+        can_split
+        and max_tokens
+        and count_tokens(SYSTEM_PROMPT + USER_PREFIX_BATCH + prompt, model) > max_tokens
+    ):
+        return await _annotate_halves(client, model, batch_msgs, max_tokens)
+    try:
+        arr = await call_llm_array(
+            client, model, SYSTEM_PROMPT, prompt, user_prefix=USER_PREFIX_BATCH
+        )
+    except Exception as e:
+        if not can_split:
+            logging.error("Single message exceeds the model context: %s", e)
+            return []
+        logging.warning(
+            "Context length exceeded for %d messages; halving", len(batch_msgs)
+        )
+        return await _annotate_halves(client, model, batch_msgs, max_tokens)
+    return _clean_llm_array(arr, len(batch_msgs))
+
+
+def _clean_llm_array(arr: Any, n: int) -> List[Dict[str, Any]]:
+    if not isinstance(arr, list) or len(arr) != n:
         return []  # signal failure
     # ensure dicts
-    clean = []
-    for obj in arr:
-        if isinstance(obj, dict):
-            clean.append(obj)
-        else:
-            clean.append({})
-    return clean
+    return [obj if isinstance(obj, dict) else {} for obj in arr]
 
 
-def annotate_batch(
-    dry_run: bool, client, model: str, batch_msgs: List[Dict[str, Any]]
+def _split_to_budget(
+    batch_msgs: List[Dict[str, Any]], model: str, max_tokens: int
+) -> List[List[Dict[str, Any]]]:
+    """Halve a batch until every part's prompt fits max_tokens (offline mode)."""
+    if len(batch_msgs) <= 1 or not max_tokens:
+        return [batch_msgs]
+    prompt = build_batch_prompt(batch_msgs)
+    if count_tokens(SYSTEM_PROMPT + USER_PREFIX_BATCH + prompt, model) <= max_tokens:
+        return [batch_msgs]
+    mid = len(batch_msgs) // 2
+    return _split_to_budget(batch_msgs[:mid], model, max_tokens) + _split_to_budget(
+        batch_msgs[mid:], model, max_tokens
+    )
+
+
+async def _annotate_halves(
+    client, model: str, batch_msgs: List[Dict[str, Any]], max_tokens: int
+) -> List[Dict[str, Any]]:
+    """Annotate each half separately; a failed half gets empty dicts (heuristics)."""
+    mid = len(batch_msgs) // 2
+    out: List[Dict[str, Any]] = []
+    for half in (batch_msgs[:mid], batch_msgs[mid:]):
+        res = await annotate_batch_with_llm(client, model, half, max_tokens)
+        out.extend(res or [{} for _ in half])
+    return out
+
+
+class AdaptiveBatchSize:
+    """Batch size steered by the p95 latency and failure rate of recent LLM calls.
+
+    Halves as soon as p95 exceeds the target or >10% of calls fail; grows by 2
+    once a full sample shows p95 under 70% of the target with no failures.
+    The window restarts after every change so the new size is judged on its own.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_size: int = MAX_BATCH_SIZE,
+        target_latency: float = TARGET_BATCH_LATENCY,
+        window: int = 20,
+        min_samples: int = 5,
+    ) -> None:
+        self.size = max(1, size)
+        self.max_size = max(max_size, self.size)
+        self.target_latency = target_latency
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=window)
+        self._failures: deque = deque(maxlen=window)
+
+    def record(self, seconds: float, failed: bool) -> None:
+        self._latencies.append(seconds)
+        self._failures.append(failed)
+        lat = sorted(self._latencies)
+        p95 = lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+        fail_rate = sum(self._failures) / len(self._failures)
+        new_size = self.size
+        if fail_rate > 0.1 or p95 > self.target_latency:
+            new_size = max(1, self.size // 2)
+        elif (
+            len(lat) >= self.min_samples
+            and not fail_rate
+            and p95 < 0.7 * self.target_latency
+        ):
+            new_size = min(self.max_size, self.size + 2)
+        if new_size != self.size:
+            logging.info(
+                "Batch size %d -> %d (p95 %.1fs, %.0f%% failed)",
+                self.size,
+                new_size,
+                p95,
+                100 * fail_rate,
+            )
+            self.size = new_size
+            self._latencies.clear()
+            self._failures.clear()
+
+
+async def annotate_batch(
+    dry_run: bool,
+    client,
+    model: str,
+    batch_msgs: List[Dict[str, Any]],
+    batch_flags: Optional[List[int]] = None,
+    max_tokens: int = 0,
+    cache: Optional["SentimentCache"] = None,
+    sizer: Optional[AdaptiveBatchSize] = None,
 ) -> List[Dict[str, Any]]:
     # 1) Try LLM (unless dry-run)
     llm_outputs: List[Dict[str, Any]] = []
     if not dry_run:
-        llm_outputs = annotate_batch_with_llm(client, model, batch_msgs)
+        t0 = time.monotonic()
+        llm_outputs = await annotate_batch_with_llm(
+            client, model, batch_msgs, max_tokens
+        )
+        if sizer is not None:
+            sizer.record(time.monotonic() - t0, failed=not llm_outputs)
+    rows = finalize_batch(batch_msgs, llm_outputs, batch_flags)
+    if cache is not None:
+        cache.put_rows(model, batch_msgs, llm_outputs, rows)
+    return rows
+
+
+def finalize_batch(
+    batch_msgs: List[Dict[str, Any]],
+    llm_outputs: List[Dict[str, Any]],
+    batch_flags: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
     # 2) If failed or dry-run: fall back to empty dicts (heuristics will fill)
     if not llm_outputs:
         llm_outputs = [{} for _ in batch_msgs]
 
     # 3) Heuristics + post-pass + attach QA fields
+    if batch_flags is None:
+        batch_flags = scan_text_flags(batch_msgs)
     out_rows: List[Dict[str, Any]] = []
-    for msg, base in zip(batch_msgs, llm_outputs):
-        row = apply_heuristics(base, msg)
-        row = _normalize_postpass(row, msg.get("body") or "")
-        # Persist identifiers & minimal provenance
-        row["message_id"] = msg.get("messageId") or ""
-        row["timestamp"] = msg.get("datetime") or ""
-        row["body"] = msg.get("body") or ""
-        row["serial_number"] = msg.get("serialNumber")
-        snd = msg.get("sender")
-        row["sender_id"] = (snd.get("phone") if isinstance(snd, dict) else snd) or ""
-        if msg.get("replyTo"):
-            row["reply_to_ref"] = msg["replyTo"].get("ref", "")
-            row["reply_to_quote"] = msg["replyTo"].get("body", "")
-        else:
-            row["reply_to_ref"] = ""
-            row["reply_to_quote"] = ""
-        out_rows.append(row)
+    for msg, base, flags in zip(batch_msgs, llm_outputs, batch_flags):
+        row = _normalize_postpass(
+            apply_heuristics(base, msg, flags), msg.get("body") or ""
+        )
+        out_rows.append(_attach_provenance(row.as_dict(), msg))
     return out_rows
 
 
+def _attach_provenance(row: Dict[str, Any], msg: Dict[str, Any]) -> Dict[str, Any]:
+    # Persist identifiers & minimal provenance
+    row["message_id"] = msg.get("messageId") or ""
+    row["timestamp"] = msg.get("datetime") or ""
+    row["body"] = msg.get("body") or ""
+    row["serial_number"] = msg.get("serialNumber")
+    snd = msg.get("sender")
+    row["sender_id"] = (snd.get("phone") if isinstance(snd, dict) else snd) or ""
+    if msg.get("replyTo"):
+        row["reply_to_ref"] = msg["replyTo"].get("ref", "")
+        row["reply_to_quote"] = msg["replyTo"].get("body", "")
+    else:
+        row["reply_to_ref"] = ""
+        row["reply_to_quote"] = ""
+    return row
+
+
 # ----------------------------
 # IO & Orchestration
 # ----------------------------
 
 
+@lru_cache(maxsize=None)
+def _prompt_fingerprint(model: str) -> str:
+    """Short hash of everything that shapes a reply besides the messages."""
+    raw = "|".join(
+        (
+            SYSTEM_PROMPT,
+            USER_PREFIX_BATCH,
+            USER_TEMPLATE_BATCH,
+            json.dumps(_response_format(model), sort_keys=True),
+        )
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+class SentimentCache:
+    """Persistent sqlite cache of annotations keyed by model + prompt + body + reactions.
+
+    The prompt fingerprint retires entries whenever the prompts or the
+    response schema change.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS annotations (key TEXT PRIMARY KEY, row_json TEXT)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def key(model: str, msg: Dict[str, Any]) -> str:
+        reacts = json.dumps(msg.get("reactions") or [], sort_keys=True)
+        raw = f"{model}|{_prompt_fingerprint(model)}|{msg.get('body') or ''}|{reacts}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        uniq = list(dict.fromkeys(keys))
+        for i in range(0, len(uniq), 500):  # stay under SQLite's variable limit
+            part = uniq[i : i + 500]
+            marks = ",".join("?" * len(part))
+            for k, row_json in self.conn.execute(
+                f"SELECT key, row_json FROM annotations WHERE key IN ({marks})", part
+            ):
+                found[k] = json.loads(row_json)
+        return found
+
+    def put_rows(
+        self,
+        model: str,
+        batch_msgs: List[Dict[str, Any]],
+        llm_outputs: List[Dict[str, Any]],
+        rows: List[Dict[str, Any]],
+    ) -> None:
+        """Store annotation fields of rows that came from the LLM (not fallbacks)."""
+        items = [
+            (
+                self.key(model, msg),
+                json.dumps(
+                    {k: row[k] for k in SCHEMA_DEFAULTS if k in row}, ensure_ascii=False
+                ),
+            )
+            for msg, base, row in zip(batch_msgs, llm_outputs, rows)
+            if base
+        ]
+        if items:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO annotations (key, row_json) VALUES (?, ?)",
+                items,
+            )
+            self.conn.commit()
+
+    def split_pending(
+        self,
+        model: str,
+        pending: List[Dict[str, Any]],
+        rows_by_id: Dict[str, Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Merge cache hits into rows_by_id; return the messages still to annotate."""
+        keys = [self.key(model, m) for m in pending]
+        cached = self.get_many(keys)
+        misses: List[Dict[str, Any]] = []
+        hit_msgs: List[Dict[str, Any]] = []
+        hit_rows: List[Dict[str, Any]] = []
+        for m, k in zip(pending, keys):
+            if k in cached:
+                hit_msgs.append(m)
+                hit_rows.append(_attach_provenance(dict(cached[k]), m))
+            else:
+                misses.append(m)
+        _merge_rows(rows_by_id, hit_msgs, hit_rows)
+        if hit_msgs:
+            logging.info("Cache: %d hits, %d to annotate", len(hit_msgs), len(misses))
+        return misses
+
+    def close(self) -> None:
+        self.conn.close()
+
+
 def _load_existing_annotations(out_path: Path) -> List[Dict[str, Any]]:
     if not out_path.exists():
         return []
     try:
-        return json.loads(out_path.read_text(encoding="utf-8"))
+        return _json_loads(out_path.read_bytes())
     except Exception:
         return []
 
@@ -681,27 +1295,63 @@ def _write_sorted_annotations(
         return int(id_to_serial.get(mid, 0))
 
     rows.sort(key=_serial_of)
-    out_path.write_text(
-        json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
+    _atomic_write_bytes(out_path, _json_dumps_pretty(rows))
     return rows
 
 
-def process_chat_file(
-    path: Path, model: str, num_workers: int, dry_run: bool, resume: bool = True
-) -> Tuple[Path, List[Dict[str, Any]]]:
-    data = json.loads(path.read_text(encoding="utf-8"))
-    messages: List[Dict[str, Any]] = data.get("messages", [])
+def _json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
 
-    # Build id->serial map for ordering and resume decisions
-    id_to_serial: Dict[str, int] = {}
-    for m in messages:
-        mid = m.get("messageId")
-        if mid:
-            try:
-                id_to_serial[mid] = int(m.get("serialNumber") or 0)
-            except Exception:
-                id_to_serial[mid] = 0
+
+def _json_dumps_pretty(obj: Any) -> bytes:
+    """UTF-8 JSON with 2-space indent (same layout from orjson and stdlib json)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+# Process umask, read once (os.umask can only be read by setting it, which
+# must not race with the autosave thread)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """Write via a temp file in the same directory + os.replace (no torn files)."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates 0600; keep the target's mode, else the umask default
+        try:
+            mode = path.stat().st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def iter_chat_messages(path: Path) -> Iterable[Dict[str, Any]]:
+    """Yield the export's messages; streamed with ijson when available."""
+    with path.open("rb") as f:
+        if ijson is not None:
+            yield from ijson.items(f, "messages.item", use_float=True)
+        else:
+            yield from _json_loads(f.read()).get("messages", [])
+
+
+def _prepare_chat_file(
+    path: Path, model: str, resume: bool
+) -> Tuple[
+    Path, Dict[str, int], Dict[str, Dict[str, Any]], List[Dict[str, Any]], List[Any]
+]:
+    """Load a chat export and its existing annotations.
+
+    Returns (out_path, id_to_serial, rows_by_id, pending_messages, existing_rows).
+    """
 
     # Output path naming: <input_stem>_<model>_sentiment.json in same directory
     def _safe_model_tag(s: str) -> str:
@@ -719,71 +1369,339 @@ def process_chat_file(
         _load_existing_annotations(legacy_out_path) if resume else []
     )
     rows_by_id: Dict[str, Dict[str, Any]] = {}
-    processed_ids: set = set()
-    max_serial_seen: int = -1
     for r in existing_rows_new + existing_rows_legacy:
-        mid = r.get("message_id")
-        if not mid:
-            continue
-        rows_by_id[mid] = r
-        processed_ids.add(mid)
-        sn = r.get("serial_number")
-        if isinstance(sn, int):
-            max_serial_seen = max(max_serial_seen, sn)
-        else:
-            max_serial_seen = max(max_serial_seen, int(id_to_serial.get(mid, -1)))
+        key = _row_key(r.get("message_id"), r.get("serial_number"))
+        if key:
+            rows_by_id[key] = r
 
-    # Decide which messages to process next, preserving original order
+    # One streaming pass: id->serial map for ordering, and pending messages in
+    # original order. Resume goes by id alone, so gaps left by batches that
+    # finished out of order before an interruption are picked up again.
+    id_to_serial: Dict[str, int] = {}
     pending_messages: List[Dict[str, Any]] = []
-    if processed_ids:
-        for m in messages:
-            mid = m.get("messageId")
-            sn = int(m.get("serialNumber") or -1)
-            if mid in processed_ids:
-                continue
-            if sn <= max_serial_seen:
-                continue
+    unkeyed = 0
+    for m in iter_chat_messages(path):
+        mid = m.get("messageId")
+        if mid:
+            try:
+                id_to_serial[mid] = int(m.get("serialNumber") or 0)
+            except Exception:
+                id_to_serial[mid] = 0
+        key = _row_key(mid, m.get("serialNumber"))
+        if not key:
+            unkeyed += 1  # could never be saved, so never resumed either
+        elif key not in rows_by_id:
             pending_messages.append(m)
-    else:
-        pending_messages = messages[:]
+    if unkeyed:
+        logging.warning(
+            "%s: skipping %d messages without messageId or serialNumber", path, unkeyed
+        )
+
+    existing_rows = existing_rows_new or existing_rows_legacy
+    return out_path, id_to_serial, rows_by_id, pending_messages, existing_rows
+
+
+def _row_key(message_id: Any, serial: Any) -> str:
+    """rows_by_id key: the message id, or the serial number for id-less messages."""
+    if message_id:
+        return message_id
+    return f"serial:{serial}" if serial is not None else ""
+
+
+def _merge_rows(
+    rows_by_id: Dict[str, Dict[str, Any]],
+    batch_msgs: List[Dict[str, Any]],
+    rows: List[Dict[str, Any]],
+) -> None:
+    for msg, row in zip(batch_msgs, rows or []):
+        # ensure serial_number present for stable ordering
+        if row.get("serial_number") is None:
+            row["serial_number"] = msg.get("serialNumber")
+        key = _row_key(
+            row.get("message_id") or msg.get("messageId"), row["serial_number"]
+        )
+        if key:
+            rows_by_id[key] = row
+
+
+async def process_chat_file_async(
+    path: Path,
+    model: str,
+    num_workers: int,
+    dry_run: bool,
+    client=None,
+    resume: bool = True,
+    batch_size: int = BATCH_SIZE,
+    max_tokens_per_batch: int = MAX_TOKENS_PER_BATCH,
+    cache: Optional[SentimentCache] = None,
+    autosave_interval: float = AUTOSAVE_INTERVAL,
+    sizer: Optional[AdaptiveBatchSize] = None,
+) -> Tuple[Path, List[Dict[str, Any]]]:
+    """Annotate one chat file with a caller-owned client (None = heuristics only).
+
+    Batches are batch_size messages, or sizer.size when an AdaptiveBatchSize is given.
+    """
+    out_path, id_to_serial, rows_by_id, pending_messages, existing_rows = (
+        _prepare_chat_file(path, model, resume)
+    )
+    if dry_run:
+        client = None
+        cache = None  # heuristics are free; cache only LLM output
+    if cache is not None and resume and pending_messages:
+        # --no-resume re-annotates everything: write the cache, don't read it
+        pending_messages = cache.split_pending(model, pending_messages, rows_by_id)
 
     if not pending_messages:
         # Nothing to do; ensure existing annotations are sorted and returned
         final_rows = (
             _write_sorted_annotations(out_path, rows_by_id, id_to_serial)
             if rows_by_id
-            else existing_rows_new or existing_rows_legacy
+            else existing_rows
         )
         return out_path, final_rows
 
-    client = None if dry_run else _load_openai_client()
+    # Keyword flags for all pending messages in one pass, before any LLM call
+    pending_flags = scan_text_flags(pending_messages)
 
-    # Build batches of 10 from pending only
-    batches: List[List[Dict[str, Any]]] = list(chunked(pending_messages, BATCH_SIZE))
+    await warm_prompt_cache(client, model)
 
-    def _job(idx: int, batch_msgs: List[Dict[str, Any]]):
-        return idx, batch_msgs, annotate_batch(dry_run, client, model, batch_msgs)
+    # Debounced autosave: serialize a snapshot off the loop at most once per
+    # interval, never two at a time; the final save happens after the loop.
+    last_save = time.monotonic()
+    save_task: Optional[asyncio.Task] = None
+
+    def _maybe_autosave() -> None:
+        nonlocal last_save, save_task
+        now = time.monotonic()
+        if now - last_save >= autosave_interval and (
+            save_task is None or save_task.done()
+        ):
+            last_save = now
+            save_task = asyncio.create_task(
+                asyncio.to_thread(
+                    _write_sorted_annotations,
+                    out_path,
+                    dict(rows_by_id),
+                    id_to_serial,
+                )
+            )
 
-    with ThreadPoolExecutor(max_workers=num_workers) as ex:
-        futs = [ex.submit(_job, i, b) for i, b in enumerate(batches)]
-        for f in as_completed(futs):
-            _, batch_msgs, rows = f.result()
+    # num_workers workers take the next batch off pending in order, sized at
+    # take time, so an adaptive batch size applies to everything not yet sent.
+    next_idx = 0
+
+    async def _worker() -> None:
+        nonlocal next_idx
+        while next_idx < len(pending_messages):
+            start = next_idx
+            next_idx += sizer.size if sizer is not None else batch_size
+            batch_msgs = pending_messages[start:next_idx]
+            rows = await annotate_batch(
+                dry_run,
+                client,
+                model,
+                batch_msgs,
+                pending_flags[start:next_idx],
+                max_tokens_per_batch,
+                cache,
+                sizer,
+            )
             # Merge rows into accumulator and autosave
-            for msg, row in zip(batch_msgs, rows or []):
-                mid = row.get("message_id") or msg.get("messageId") or ""
-                if not mid:
-                    continue
-                # ensure serial_number present for stable ordering
-                if row.get("serial_number") is None:
-                    row["serial_number"] = msg.get("serialNumber")
-                rows_by_id[mid] = row
-            _write_sorted_annotations(out_path, rows_by_id, id_to_serial)
+            _merge_rows(rows_by_id, batch_msgs, rows)
+            _maybe_autosave()
+
+    try:
+        await asyncio.gather(*(_worker() for _ in range(max(1, num_workers))))
+    finally:
+        if save_task is not None:
+            await save_task
 
     # Finalize and return
     final_rows = _write_sorted_annotations(out_path, rows_by_id, id_to_serial)
     return out_path, final_rows
 
 
+def process_chat_file(
+    path: Path,
+    model: str,
+    num_workers: int,
+    dry_run: bool,
+    **kwargs: Any,
+) -> Tuple[Path, List[Dict[str, Any]]]:
+    """Synchronous single-file entry point; builds and closes its own client."""
+
+    async def _run() -> Tuple[Path, List[Dict[str, Any]]]:
+        client = None if dry_run else _load_openai_client(num_workers * 4)
+        try:
+            return await process_chat_file_async(
+                path, model, num_workers, dry_run, client, **kwargs
+            )
+        finally:
+            if client is not None:
+                await client.close()
+
+    return asyncio.run(_run())
+
+
+async def process_chat_files(
+    paths: Iterable[Path],
+    model: str,
+    num_workers: int,
+    dry_run: bool,
+    batch_size: int = BATCH_SIZE,
+    target_latency: float = TARGET_BATCH_LATENCY,
+    **kwargs: Any,
+) -> List[Tuple[Path, List[Dict[str, Any]]]]:
+    """Annotate files one after another on one event loop and one HTTP client,
+    so the connection pool stays warm across a folder of chats.
+
+    With a client and target_latency > 0 the batch size adapts (starting at
+    batch_size) and carries over from one file to the next.
+    """
+    client = None if dry_run else _load_openai_client(num_workers * 4)
+    sizer = (
+        AdaptiveBatchSize(batch_size, target_latency=target_latency)
+        if client is not None and target_latency > 0
+        else None
+    )
+    kwargs.update(batch_size=batch_size, sizer=sizer)
+    results = []
+    try:
+        for p in paths:
+            logging.info("Processing: %s", p)
+            out_path, annots = await process_chat_file_async(
+                p, model, num_workers, dry_run, client, **kwargs
+            )
+            logging.info("Wrote: %s", out_path)
+            results.append((out_path, annots))
+    finally:
+        if client is not None:
+            await client.close()
+    return results
+
+
+async def _run_offline_batch_job(
+    client, requests: List[Dict[str, Any]]
+) -> Dict[str, str]:
+    """Upload one JSONL of chat requests, wait for it, return custom_id -> content."""
+    payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in requests)
+    upload = await client.files.create(
+        file=("batch.jsonl", payload.encode("utf-8")), purpose="batch"
+    )
+    job = await client.batches.create(
+        input_file_id=upload.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logging.info("Submitted offline batch %s (%d requests)", job.id, len(requests))
+    while job.status not in OFFLINE_DONE_STATUSES:
+        await asyncio.sleep(OFFLINE_POLL_SECONDS)
+        job = await client.batches.retrieve(job.id)
+    logging.info("Offline batch %s finished: %s", job.id, job.status)
+    if not job.output_file_id:
+        return {}
+
+    # Expired/cancelled jobs still return the requests that did complete
+    content = await client.files.content(job.output_file_id)
+    results: Dict[str, str] = {}
+    for line in content.text.splitlines():
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        resp = rec.get("response") or {}
+        if resp.get("status_code") != 200:
+            continue
+        try:
+            results[rec["custom_id"]] = resp["body"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            continue
+    return results
+
+
+def run_offline_batch(
+    paths: List[Path],
+    model: str,
+    resume: bool = True,
+    batch_size: int = BATCH_SIZE,
+    max_tokens_per_batch: int = MAX_TOKENS_PER_BATCH,
+    cache: Optional[SentimentCache] = None,
+) -> List[Tuple[Path, List[Dict[str, Any]]]]:
+    """Annotate all files through the OpenAI Batch API, then apply heuristics.
+
+    Batches that are missing from the output (failed, expired, unparsable)
+    fall back to heuristics, like a failed synchronous call.
+    """
+    prepared = []
+    requests: List[Dict[str, Any]] = []
+    for fi, path in enumerate(paths):
+        out_path, id_to_serial, rows_by_id, pending, existing_rows = _prepare_chat_file(
+            path, model, resume
+        )
+        if cache is not None and resume and pending:
+            pending = cache.split_pending(model, pending, rows_by_id)
+        batches: List[List[Dict[str, Any]]] = []
+        for b in chunked(pending, batch_size):
+            batches.extend(_split_to_budget(b, model, max_tokens_per_batch))
+        for bi, b in enumerate(batches):
+            messages = _chat_messages(
+                SYSTEM_PROMPT, build_batch_prompt(b), USER_PREFIX_BATCH
+            )
+            requests.append(
+                {
+                    "custom_id": f"f={fi};b={bi}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": model,
+                        "messages": messages,
+                        "temperature": 1.0,
+                        **_format_kwargs(model),
+                    },
+                }
+            )
+        prepared.append((out_path, id_to_serial, rows_by_id, batches, existing_rows))
+
+    async def _run() -> Dict[str, str]:
+        client = _load_openai_client() if requests else None
+        if client is None:
+            return {}
+        try:
+            parts = await asyncio.gather(
+                *(
+                    _run_offline_batch_job(client, part)
+                    for part in chunked(requests, OFFLINE_MAX_REQUESTS)
+                )
+            )
+        finally:
+            await client.close()
+        return {k: v for part in parts for k, v in part.items()}
+
+    contents = asyncio.run(_run())
+
+    results = []
+    for fi, (out_path, id_to_serial, rows_by_id, batches, existing_rows) in enumerate(
+        prepared
+    ):
+        if not batches and not rows_by_id:
+            results.append((out_path, existing_rows))
+            continue
+        for bi, b in enumerate(batches):
+            llm_outputs: List[Dict[str, Any]] = []
+            content = contents.get(f"f={fi};b={bi}")
+            if content:
+                try:
+                    llm_outputs = _clean_llm_array(_extract_array(content), len(b))
+                except ValueError as e:
+                    logging.warning("Offline batch f=%d;b=%d unparsable: %s", fi, bi, e)
+            rows = finalize_batch(b, llm_outputs)
+            if cache is not None:
+                cache.put_rows(model, b, llm_outputs, rows)
+            _merge_rows(rows_by_id, b, rows)
+        final_rows = _write_sorted_annotations(out_path, rows_by_id, id_to_serial)
+        results.append((out_path, final_rows))
+    return results
+
+
 def iter_input_paths(input_path: Path) -> Iterable[Path]:
     if input_path.is_file():
         yield input_path
@@ -795,65 +1713,120 @@ def iter_input_paths(input_path: Path) -> Iterable[Path]:
             yield p
 
 
+# Combined export columns, in order, with their kind
+COMBINED_FIELDS = {
+    "message_id": "str",
+    "timestamp": "str",
+    "sender_id": "str",
+    "polarity": "float",
+    "emotion_primary": "str",
+    "emotion_summary": "str",
+    "stress_score": "float",
+    "uncertainty_score": "float",
+    "help_request": "bool",
+    "helpfulness": "float",
+    "gratitude": "bool",
+    "toxicity_score": "float",
+    "info_drop": "bool",
+    "reactions_pos": "int",
+    "reactions_neu": "int",
+    "reactions_neg": "int",
+    "evidence_terms": "list",
+    "reply_to_ref": "str",
+    "reply_to_quote": "str",
+    "body": "str",
+}
+
+REACTION_FIELDS = {
+    "reactions_pos": "positive",
+    "reactions_neu": "neutral",
+    "reactions_neg": "negative",
+}
+
+
 def write_combined_csv(rows: List[Dict[str, Any]], csv_path: Path) -> None:
     # Flatten reaction_sentiment
     for r in rows:
         rs = r.get("reaction_sentiment") or {}
-        r["reactions_pos"] = rs.get("positive", 0)
-        r["reactions_neu"] = rs.get("neutral", 0)
-        r["reactions_neg"] = rs.get("negative", 0)
+        for k, src in REACTION_FIELDS.items():
+            r[k] = rs.get(src, 0)
         r.pop("reaction_sentiment", None)
 
-    field_order = [
-        "message_id",
-        "timestamp",
-        "sender_id",
-        "polarity",
-        "emotion_primary",
-        "emotion_summary",
-        "stress_score",
-        "uncertainty_score",
-        "help_request",
-        "helpfulness",
-        "gratitude",
-        "toxicity_score",
-        "info_drop",
-        "reactions_pos",
-        "reactions_neu",
-        "reactions_neg",
-        "evidence_terms",
-        "reply_to_ref",
-        "reply_to_quote",
-        "body",
-    ]
-
     for r in rows:
-        for k in field_order:
+        for k, kind in COMBINED_FIELDS.items():
             if k not in r:
-                r[k] = (
-                    ""
-                    if k
-                    in (
-                        "message_id",
-                        "timestamp",
-                        "sender_id",
-                        "emotion_primary",
-                        "emotion_summary",
-                        "evidence_terms",
-                        "reply_to_ref",
-                        "reply_to_quote",
-                        "body",
-                    )
-                    else 0
-                )
+                r[k] = "" if kind in ("str", "list") else 0
 
     with csv_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=field_order)
+        w = csv.DictWriter(f, fieldnames=list(COMBINED_FIELDS), extrasaction="ignore")
         w.writeheader()
         for r in rows:
             w.writerow(r)
 
 
+def _as_bool(v: Any) -> bool:
+    if isinstance(v, str):
+        return v.strip().lower() in ("true", "1", "yes")
+    return bool(v)
+
+
+def _as_float(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _as_int(v: Any) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _as_terms(v: Any) -> List[str]:
+    if isinstance(v, list):
+        return [str(t) for t in v]
+    return [str(v)] if v else []
+
+
+def write_combined_parquet(rows: List[Dict[str, Any]], out_path: Path) -> None:
+    """Column-major combined export: one list per field, one Parquet write."""
+    converters = {
+        "str": (lambda v: "" if v is None else str(v), pa.string()),
+        "float": (_as_float, pa.float64()),
+        "bool": (_as_bool, pa.bool_()),
+        "int": (_as_int, pa.int64()),
+        "list": (_as_terms, pa.list_(pa.string())),
+    }
+    fields = [(k, *converters[kind]) for k, kind in COMBINED_FIELDS.items()]
+    cols: Dict[str, List[Any]] = {k: [] for k in COMBINED_FIELDS}
+    appends = [(k, cols[k].append, conv) for k, conv, _ in fields]
+    for r in rows:
+        rs = r.get("reaction_sentiment") or {}
+        for k, append, conv in appends:
+            v = rs.get(REACTION_FIELDS[k], 0) if k in REACTION_FIELDS else r.get(k)
+            append(conv(v))
+
+    table = pa.table({k: pa.array(cols[k], type=typ) for k, _, typ in fields})
+    pq.write_table(table, out_path, compression="zstd")
+
+
+def write_combined(
+    rows: List[Dict[str, Any]], path: Path, csv_compat: bool = False
+) -> Path:
+    """Write the combined labels as Parquet (default) or CSV; return the path written."""
+    if not csv_compat and pa is None:
+        logging.warning("pyarrow not installed; writing combined CSV instead")
+        csv_compat = True
+    if csv_compat:
+        write_combined_csv(rows, path)
+        return path
+    out_path = path.with_suffix(".parquet")
+    write_combined_parquet(rows, out_path)
+    return out_path
+
+
 # ----------------------------
 # CLI
 # ----------------------------
@@ -861,7 +1834,7 @@ def write_combined_csv(rows: List[Dict[str, Any]], csv_path: Path) -> None:
 
 def main(argv=None):
     parser = argparse.ArgumentParser(
-        description="Batched (10) WhatsApp sentiment annotator."
+        description="Batched WhatsApp sentiment annotator."
     )
     parser.add_argument(
         "--input", required=True, help="Path to chat.json or folder of JSON files"
@@ -875,22 +1848,64 @@ def main(argv=None):
         default=8,
         help="Number of concurrent LLM batches (default=4)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Messages per LLM call (default={BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=float,
+        default=TARGET_BATCH_LATENCY,
+        help="Adapt the batch size to keep p95 LLM latency under this many seconds "
+        "(0 = fixed --batch-size)",
+    )
+    parser.add_argument(
+        "--max-tokens-per-batch",
+        type=int,
+        default=MAX_TOKENS_PER_BATCH,
+        help="Halve batches whose prompt exceeds this many tokens (0 disables)",
+    )
     parser.add_argument(
         "--dry-run", action="store_true", help="Heuristics-only mode (no LLM calls)"
     )
+    parser.add_argument(
+        "--offline-batch",
+        action="store_true",
+        help="Submit all batches as one OpenAI Batch API job (50%% cost, up to 24h)",
+    )
     parser.add_argument(
         "--combined-csv",
         type=str,
         default="",
-        help="Optional path to write a combined CSV of all labels",
+        help="Optional path for the combined labels (written as .parquet unless --csv-compat)",
+    )
+    parser.add_argument(
+        "--csv-compat",
+        action="store_true",
+        help="Write the combined labels as CSV instead of Parquet",
     )
     parser.add_argument(
         "--no-resume",
         dest="resume",
         action="store_false",
-        help="Disable resume from existing .sentiment.json (default resumes)",
+        help="Re-annotate everything: ignore existing .sentiment.json and cached "
+        "annotations (the cache is still updated)",
     )
-    parser.set_defaults(resume=True)
+    parser.add_argument(
+        "--autosave-interval",
+        type=float,
+        default=AUTOSAVE_INTERVAL,
+        help=f"Seconds between partial saves of the output (default={AUTOSAVE_INTERVAL:g})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help=f"Do not read/write the {CACHE_FILENAME} annotation cache",
+    )
+    parser.set_defaults(resume=True, cache=True)
     args = parser.parse_args(argv)
 
     logging.basicConfig(
@@ -902,23 +1917,47 @@ def main(argv=None):
         logging.error("Input path not found: %s", input_path)
         sys.exit(2)
 
+    cache: Optional[SentimentCache] = None
+    if args.cache and not args.dry_run:
+        cache_dir = input_path if input_path.is_dir() else input_path.parent
+        cache = SentimentCache(cache_dir / CACHE_FILENAME)
+
     all_rows: List[Dict[str, Any]] = []
-    for p in iter_input_paths(input_path):
-        logging.info("Processing: %s", p)
-        out_path, annots = process_chat_file(
-            p,
+    if args.offline_batch and not args.dry_run:
+        for out_path, annots in run_offline_batch(
+            list(iter_input_paths(input_path)),
             model=args.model,
-            num_workers=args.num_workers,
-            dry_run=args.dry_run,
             resume=args.resume,
-        )
-        logging.info("Wrote: %s", out_path)
-        all_rows.extend(annots)
+            batch_size=args.batch_size,
+            max_tokens_per_batch=args.max_tokens_per_batch,
+            cache=cache,
+        ):
+            logging.info("Wrote: %s", out_path)
+            all_rows.extend(annots)
+    else:
+        for out_path, annots in asyncio.run(
+            process_chat_files(
+                iter_input_paths(input_path),
+                model=args.model,
+                num_workers=args.num_workers,
+                dry_run=args.dry_run,
+                resume=args.resume,
+                batch_size=args.batch_size,
+                target_latency=args.target_latency,
+                max_tokens_per_batch=args.max_tokens_per_batch,
+                cache=cache,
+                autosave_interval=args.autosave_interval,
+            )
+        ):
+            all_rows.extend(annots)
+    if cache is not None:
+        cache.close()
 
     if args.combined_csv:
-        csv_path = Path(args.combined_csv)
-        write_combined_csv(all_rows, csv_path)
-        logging.info("Combined CSV: %s", csv_path)
+        out_path = write_combined(
+            all_rows, Path(args.combined_csv), csv_compat=args.csv_compat
+        )
+        logging.info("Combined labels: %s", out_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import sentiment_analysis_pipeline as sap  # noqa: E402
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions; `reply(kwargs)` returns content or raises."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.reply(kwargs)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_client(reply):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(reply)))
+
+
+@pytest.fixture(autouse=True)
+def _fresh_warmup(monkeypatch):
+    monkeypatch.setattr(sap, "_WARMED_MODELS", set())
+
+
+def test_warm_up_skipped_for_short_prefix(monkeypatch):
+    client = fake_client(lambda kw: "{}")
+    monkeypatch.setattr(sap, "count_tokens", lambda text, model: 500)
+
+    asyncio.run(sap.warm_prompt_cache(client, "gpt-4o-mini"))
+
+    assert client.chat.completions.calls == []
+
+
+def test_warm_up_sent_once_for_cacheable_prefix(monkeypatch):
+    client = fake_client(lambda kw: "{}")
+    monkeypatch.setattr(sap, "count_tokens", lambda text, model: 2000)
+
+    asyncio.run(sap.warm_prompt_cache(client, "gpt-4o-mini"))
+    asyncio.run(sap.warm_prompt_cache(client, "gpt-4o-mini"))
+
+    assert len(client.chat.completions.calls) == 1
+    assert client.chat.completions.calls[0]["max_completion_tokens"] == 1
+
+
+def _annotations(n):
+    return [dict(sap.SCHEMA_DEFAULTS, polarity=0.1 * i) for i in range(n)]
+
+
+@pytest.mark.parametrize(
+    "model, expected_type",
+    [("gpt-4o-mini", "json_schema"), ("gpt-4-turbo", "json_object"), ("gpt-4", None)],
+)
+def test_response_format_per_model(model, expected_type):
+    arr = _annotations(2)
+    # Free-form models may wrap the array in prose
+    client = fake_client(lambda kw: "Here you go: " + json.dumps(arr) + " done")
+
+    out = asyncio.run(sap.call_llm_array(client, model, "sys", "user"))
+
+    sent = client.chat.completions.calls[0]
+    assert sent.get("response_format", {}).get("type") == expected_type
+    assert out == arr
+
+
+def _write_chat(path, messages):
+    path.write_text(json.dumps({"messages": messages}), encoding="utf-8")
+
+
+def _msg(serial, mid=True, body=None):
+    m = {"serialNumber": serial, "body": body or f"message {serial}"}
+    if mid:
+        m["messageId"] = f"id-{serial}"
+    return m
+
+
+def test_resume_picks_up_gaps(tmp_path):
+    chat = tmp_path / "chat.json"
+    _write_chat(chat, [_msg(i) for i in range(1, 6)])
+    out_path, _ = sap.process_chat_file(chat, "m", 1, True)
+    rows = json.loads(out_path.read_text(encoding="utf-8"))
+    # Batches finished out of order before an interruption: 2 and 4 are missing
+    out_path.write_text(json.dumps(rows[0::2]), encoding="utf-8")
+
+    _, _, rows_by_id, pending, _ = sap._prepare_chat_file(chat, "m", resume=True)
+
+    assert [m["serialNumber"] for m in pending] == [2, 4]
+    assert set(rows_by_id) == {"id-1", "id-3", "id-5"}
+
+
+def test_resume_keys_id_less_messages_by_serial(tmp_path):
+    chat = tmp_path / "chat.json"
+    _write_chat(chat, [_msg(1), _msg(2, mid=False), _msg(3)])
+
+    out_path, rows = sap.process_chat_file(chat, "m", 1, True)
+    assert [r["serial_number"] for r in rows] == [1, 2, 3]
+
+    _, _, rows_by_id, pending, _ = sap._prepare_chat_file(chat, "m", resume=True)
+    assert pending == []
+    assert "serial:2" in rows_by_id
+
+
+def test_resume_skips_unkeyable_messages(tmp_path, caplog):
+    chat = tmp_path / "chat.json"
+    _write_chat(chat, [_msg(1), {"body": "no id, no serial"}])
+
+    _, _, _, pending, _ = sap._prepare_chat_file(chat, "m", resume=True)
+
+    assert [m["serialNumber"] for m in pending] == [1]
+    assert "skipping 1 messages" in caplog.text
+
+
+def test_no_resume_reannotates_everything(tmp_path):
+    chat = tmp_path / "chat.json"
+    _write_chat(chat, [_msg(i) for i in range(1, 4)])
+    sap.process_chat_file(chat, "m", 1, True)
+
+    _, _, rows_by_id, pending, _ = sap._prepare_chat_file(chat, "m", resume=False)
+
+    assert rows_by_id == {}
+    assert len(pending) == 3
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, code=None):
+        super().__init__(f"{status_code} {code}")
+        self.status_code = status_code
+        self.code = code
+
+
+def _batch_reply(max_lines):
+    """Annotate every "N) " line, or fail with context_length_exceeded above max_lines."""
+
+    def reply(kwargs):
+        user = kwargs["messages"][-1]["content"]
+        n = sum(1 for line in user.splitlines() if line[:1].isdigit() and ") " in line)
+        if n > max_lines:
+            raise FakeAPIError(400, "context_length_exceeded")
+        return json.dumps({"annotations": _annotations(n)})
+
+    return reply
+
+
+def test_context_length_error_halves_batch():
+    client = fake_client(_batch_reply(max_lines=2))
+    msgs = [_msg(i) for i in range(1, 9)]
+
+    out = asyncio.run(sap.annotate_batch_with_llm(client, "gpt-4o-mini", msgs))
+
+    assert len(out) == 8 and all(out)
+    # 8 -> 4+4 -> 2+2+2+2: one call per node of the split tree
+    assert len(client.chat.completions.calls) == 7
+
+
+def test_other_bad_request_fails_once_without_splitting():
+    def reply(kwargs):
+        raise FakeAPIError(400, "unsupported_parameter")
+
+    client = fake_client(reply)
+    msgs = [_msg(i) for i in range(1, 9)]
+
+    out = asyncio.run(sap.annotate_batch_with_llm(client, "gpt-4o-mini", msgs))
+
+    assert out == []
+    assert len(client.chat.completions.calls) == 1
+
+
+def test_failed_batch_falls_back_to_heuristics():
+    def reply(kwargs):
+        raise FakeAPIError(400, "model_not_found")
+
+    msgs = [_msg(1, body="תודה רבה!")]
+    rows = asyncio.run(
+        sap.annotate_batch(False, fake_client(reply), "gpt-4o-mini", msgs)
+    )
+
+    assert rows[0]["gratitude"] is True
+    assert rows[0]["message_id"] == "id-1"
+
+
+def test_adaptive_batch_size():
+    sizer = sap.AdaptiveBatchSize(16, max_size=20, target_latency=10, min_samples=3)
+
+    sizer.record(12.0, failed=False)  # p95 over target: halve at once
+    assert sizer.size == 8
+
+    for _ in range(3):
+        sizer.record(1.0, failed=False)  # fast and clean: grow by 2
+    assert sizer.size == 10
+
+    sizer.record(1.0, failed=True)  # failure rate over 10%: halve
+    assert sizer.size == 5
+
+    big = sap.AdaptiveBatchSize(18, max_size=20, target_latency=10, min_samples=1)
+    for _ in range(5):
+        big.record(1.0, failed=False)
+    assert big.size == 20  # capped
+
+
+def test_cache_round_trip_and_prompt_versioning(tmp_path, monkeypatch):
+    cache = sap.SentimentCache(tmp_path / "cache.sqlite")
+    msgs = [_msg(1, body="same text"), _msg(2, body="other")]
+    llm_outputs = [dict(sap.SCHEMA_DEFAULTS, polarity=0.5), {}]  # 2nd failed
+    rows = sap.finalize_batch(msgs, llm_outputs)
+    cache.put_rows("m", msgs, llm_outputs, rows)
+
+    # Same body under another id is served from the cache; fallbacks are not cached
+    pending = [_msg(3, body="same text"), _msg(4, body="other")]
+    rows_by_id = {}
+    misses = cache.split_pending("m", pending, rows_by_id)
+    assert [m["serialNumber"] for m in misses] == [4]
+    assert rows_by_id["id-3"]["polarity"] == rows[0]["polarity"]
+    assert rows_by_id["id-3"]["serial_number"] == 3
+
+    # A prompt change retires every entry
+    monkeypatch.setattr(sap, "SYSTEM_PROMPT", sap.SYSTEM_PROMPT + "\nBe brief.")
+    sap._prompt_fingerprint.cache_clear()
+    try:
+        assert len(cache.split_pending("m", pending, {})) == 2
+    finally:
+        sap._prompt_fingerprint.cache_clear()
+        cache.close()